@@ -0,0 +1,95 @@
+import gzip, json, os
+
+
+class ColdArchive:
+    """Холодный архив: неактивные игроки и чаты, из которых бот ушёл.
+
+    Один gzip-файл на чат (`<chat_id>.json.gz`) вида
+    {"chat": <поля чата без users> | null, "users": {uid: запись}}.
+    "chat" заполнен, только если в архив ушёл весь чат. В памяти держим
+    лишь индекс: какие игроки лежат в архиве каждого чата. Сами записи
+    читаются (и файл распаковывается) только когда игрок там точно есть.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._users = {}    # chat_id → множество user_id в архиве чата
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith('.json.gz'):
+                    # Индекс строится один раз при открытии архива
+                    with gzip.open(os.path.join(directory, name), 'rt', encoding='utf-8') as f:
+                        self._users[name[:-len('.json.gz')]] = set(json.load(f)["users"])
+
+    def _path(self, chat_id) -> str:
+        return os.path.join(self.directory, f"{chat_id}.json.gz")
+
+    def __contains__(self, chat_id):
+        return str(chat_id) in self._users
+
+    def __len__(self):
+        return len(self._users)
+
+    def has_user(self, chat_id, user_id) -> bool:
+        users = self._users.get(str(chat_id))
+        return users is not None and str(user_id) in users
+
+    def user_ids(self, chat_id) -> frozenset:
+        """user_id игроков в архиве чата — по индексу, без распаковки."""
+        return frozenset(self._users.get(str(chat_id), ()))
+
+    def read(self, chat_id):
+        if str(chat_id) not in self._users:
+            return {"chat": None, "users": {}}
+        with gzip.open(self._path(chat_id), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def write(self, chat_id, entry):
+        """Записать архив чата атомарно; пустой архив удаляется."""
+        cid = str(chat_id)
+        path = self._path(cid)
+        if entry["chat"] is None and not entry["users"]:
+            if cid in self._users:
+                os.remove(path)
+                del self._users[cid]
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+        self._users[cid] = set(entry["users"])
+
+    # --- Перенос записей ------------------------------------------------
+    def put_users(self, chat_id, users: dict):
+        entry = self.read(chat_id)
+        entry["users"].update(users)
+        self.write(chat_id, entry)
+
+    def put_chat(self, chat_id, chat: dict):
+        entry = self.read(chat_id)
+        chat = dict(chat)
+        entry["users"].update(chat.pop("users", {}))
+        entry["chat"] = chat
+        self.write(chat_id, entry)
+
+    def peek_user(self, chat_id, user_id):
+        if not self.has_user(chat_id, user_id):
+            return None
+        return self.read(chat_id)["users"].get(str(user_id))
+
+    def drop(self, chat_id, user_ids=(), chat: bool = False):
+        """Убрать из архива чата перечисленных игроков и (chat=True) запись самого чата.
+
+        Остальные игроки остаются: их могли заархивировать уже после того,
+        как чат был поднят из архива.
+        """
+        if str(chat_id) not in self._users:
+            return
+        entry = self.read(chat_id)
+        changed = chat and entry["chat"] is not None
+        if chat:
+            entry["chat"] = None
+        for uid in user_ids:
+            changed |= entry["users"].pop(str(uid), None) is not None
+        if changed:
+            self.write(chat_id, entry)
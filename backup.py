@@ -0,0 +1,246 @@
+# backup.py
+"""Снимки и инкрементальные бэкапы storage.json.
+
+Полный бэкап содержит все чаты, инкрементальный — только чаты, изменившиеся
+с предыдущего снимка (и список удалённых). Файлы сжаты gzip, цепочки
+«полный + инкременты» ротируются. Работает и внутри бота (задача JobQueue,
+см. main.py), и из консоли:
+
+    python backup.py snapshot [--full]     # снимок из storage.json (бот остановлен)
+    python backup.py list                  # список бэкапов
+    python backup.py restore [--upto ИМЯ] [--out storage.json]
+"""
+
+import argparse
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import settings
+
+
+def chat_hash(raw: str) -> str:
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class BackupStore:
+    def __init__(self, directory: str = settings.BACKUP_DIR):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self._hold = None   # файл .bot.lock, пока бэкапы снимает запущенный бот
+
+    # --- Manifest -------------------------------------------------------
+    @contextmanager
+    def _locked(self):
+        """Межпроцессная блокировка: бот и консольная команда не пишут одновременно."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def hold(self) -> bool:
+        """Занять папку за запущенным ботом до конца процесса; False — её уже держит другой."""
+        if self._hold is None:
+            os.makedirs(self.directory, exist_ok=True)
+            f = open(os.path.join(self.directory, '.bot.lock'), 'w')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                return False
+            self._hold = f
+        return True
+
+    def held_by_bot(self) -> bool:
+        path = os.path.join(self.directory, '.bot.lock')
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(f, fcntl.LOCK_UN)
+        return False
+
+    def load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        # chain — бэкапы по порядку; hashes — хэши чатов на момент последнего снимка
+        return {"chain": [], "hashes": {}}
+
+    def _save_manifest(self, manifest):
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def needs_full(self) -> bool:
+        """Пора ли делать полный снимок (нет полного или цепочка слишком длинная)."""
+        chain = self.load_manifest()["chain"]
+        since_full = 0
+        for entry in reversed(chain):
+            if entry["kind"] == "full":
+                return since_full >= settings.BACKUP_FULL_EVERY
+            since_full += 1
+        return True
+
+    # --- Запись ---------------------------------------------------------
+    def write(self, chats_raw: dict, removed=(), full: bool = False, complete: bool = False):
+        """Записать бэкап из уже сериализованных чатов ({chat_id: json}).
+
+        full — полный снимок (chats_raw содержит все чаты).
+        complete — chats_raw содержит все чаты, но нужен инкремент: изменения
+        и удаления вычисляются по хэшам из манифеста.
+        Возвращает запись манифеста или None, если менять нечего.
+        """
+        with self._locked():
+            manifest = self.load_manifest()
+            hashes = manifest["hashes"]
+            new_hashes = {cid: chat_hash(raw) for cid, raw in chats_raw.items()}
+
+            if full:
+                changed = new_hashes
+                removed = []
+            else:
+                changed = {cid: h for cid, h in new_hashes.items() if hashes.get(cid) != h}
+                if complete:
+                    removed = [cid for cid in hashes if cid not in chats_raw]
+                removed = [cid for cid in removed if cid in hashes]
+                if not changed and not removed:
+                    return None
+
+            ts = time.time()
+            kind = "full" if full else "incr"
+            while True:
+                name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(ts))}-{int(ts * 1000) % 1000:03d}-{kind}.json.gz"
+                # Два бэкапа в одну миллисекунду не должны затереть друг друга
+                if not os.path.exists(os.path.join(self.directory, name)):
+                    break
+                ts += 0.001
+            body = '{"ts":%s,"kind":"%s","removed":%s,"chats":{%s}}' % (
+                json.dumps(ts), kind, json.dumps(removed),
+                ",".join(f"{json.dumps(cid)}:{chats_raw[cid]}" for cid in changed),
+            )
+            path = os.path.join(self.directory, name)
+            with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+                f.write(body)
+            os.replace(path + '.tmp', path)
+
+            if full:
+                manifest["hashes"] = dict(new_hashes)
+            else:
+                hashes.update(changed)
+                for cid in removed:
+                    hashes.pop(cid, None)
+            entry = {"file": name, "kind": kind, "ts": ts, "chats": len(changed), "removed": len(removed)}
+            manifest["chain"].append(entry)
+            if full:
+                self._rotate(manifest)
+            self._save_manifest(manifest)
+            return entry
+
+    def _rotate(self, manifest):
+        """Оставить последние BACKUP_KEEP_CHAINS цепочек (полный + его инкременты)."""
+        fulls = [i for i, e in enumerate(manifest["chain"]) if e["kind"] == "full"]
+        if len(fulls) <= settings.BACKUP_KEEP_CHAINS:
+            return
+        cut = fulls[-settings.BACKUP_KEEP_CHAINS]
+        for entry in manifest["chain"][:cut]:
+            try:
+                os.remove(os.path.join(self.directory, entry["file"]))
+            except FileNotFoundError:
+                pass
+        manifest["chain"] = manifest["chain"][cut:]
+
+    # --- Восстановление -------------------------------------------------
+    def read(self, name: str):
+        with gzip.open(os.path.join(self.directory, name), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def restore(self, upto: str | None = None):
+        """Собрать состояние storage на момент бэкапа upto (по умолчанию — последнего)."""
+        chain = self.load_manifest()["chain"]
+        if upto is not None:
+            names = [e["file"] for e in chain]
+            if upto not in names:
+                raise ValueError(f"backup {upto} not found")
+            chain = chain[:names.index(upto) + 1]
+        fulls = [i for i, e in enumerate(chain) if e["kind"] == "full"]
+        if not fulls:
+            raise ValueError("no full backup to restore from")
+        data = {}
+        for entry in chain[fulls[-1]:]:
+            snap = self.read(entry["file"])
+            data.update(snap["chats"])
+            for cid in snap["removed"]:
+                data.pop(cid, None)
+        return data
+
+
+def snapshot_file(store: BackupStore, path: str, full: bool = False):
+    """Снимок из storage.json (файл заменяется атомарно, поэтому читается целиком).
+
+    Пока бот запущен, хэши в манифесте — от его памяти, а storage.json на
+    диске отстаёт от неё: инкремент по файлу откатил бы изменённые чаты и
+    пометил удалёнными ещё не сохранённые. Поэтому снимок только при
+    остановленном боте.
+    """
+    if store.held_by_bot():
+        raise RuntimeError("bot is running and takes backups itself")
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    chats_raw = {cid: json.dumps(chat, ensure_ascii=False) for cid, chat in data.items()}
+    full = full or store.needs_full()
+    return store.write(chats_raw, full=full, complete=True)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Бэкапы storage.json")
+    p.add_argument("--dir", default=settings.BACKUP_DIR, help="папка бэкапов")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    snap = sub.add_parser("snapshot", help="снять бэкап с storage.json")
+    snap.add_argument("--full", action="store_true", help="принудительно полный снимок")
+    snap.add_argument("--storage", default=settings.STATS_FILE, help="путь к storage.json")
+    sub.add_parser("list", help="список бэкапов")
+    rest = sub.add_parser("restore", help="восстановить storage.json (бот должен быть остановлен)")
+    rest.add_argument("--upto", help="имя бэкапа, до которого восстанавливать")
+    rest.add_argument("--out", default=settings.STATS_FILE, help="куда записать storage.json")
+    args = p.parse_args(argv)
+
+    store = BackupStore(args.dir)
+    if args.cmd == "snapshot":
+        try:
+            entry = snapshot_file(store, args.storage, full=args.full)
+        except RuntimeError:
+            print("Бот запущен и сам снимает бэкапы; снимок из storage.json отстал бы от него. "
+                  "Остановите бота или дождитесь его бэкапа.", file=sys.stderr)
+            return 1
+        print(f"Бэкап: {entry['file']} ({entry['chats']} чатов)" if entry else "Изменений нет, бэкап не нужен.")
+    elif args.cmd == "list":
+        for e in store.load_manifest()["chain"]:
+            when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(e["ts"]))
+            print(f"{e['file']}\t{e['kind']}\t{when}\tчатов: {e['chats']}\tудалено: {e['removed']}")
+    elif args.cmd == "restore":
+        data = store.restore(args.upto)
+        if os.path.exists(args.out):
+            os.replace(args.out, args.out + '.before-restore')
+        tmp = args.out + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, args.out)
+        print(f"Восстановлено {len(data)} чатов в {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+#!/bin/bash
+# Снять бэкап storage.json (инкрементальный; --full — полный)
+BOT_DIR="$(cd "$(dirname "$0")" && pwd)"
+BOT_NAME="$(basename "$BOT_DIR")"
+
+cd "$BOT_DIR" || exit 1
+
+# Активируем виртуальное окружение
+source venv/bin/activate 2>/dev/null || true
+
+echo "Бэкап бота $BOT_NAME..."
+python3 backup.py snapshot "$@"
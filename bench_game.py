@@ -0,0 +1,155 @@
+# bench_game.py
+"""Микробенчмарки движка game.py (без Telegram и без диска).
+
+    python bench_game.py                       # таблица результатов
+    python bench_game.py --json base.json      # сохранить результаты
+    python bench_game.py --compare base.json   # сравнить с сохранёнными
+
+storage в game.py подменяется заглушкой, поэтому Game.results измеряет
+только вычисления, а не запись storage.json.
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import game
+from game import Game, new_deck, hand_value, fmt_hand, Card
+
+
+class _NullStorage:
+    """Заглушка Storage: принимает вызовы из Game.results и ничего не пишет."""
+
+    def __init__(self):
+        self._user = {"money": 0, "wins": 0, "games": 0}
+
+    def get_user(self, chat_id, user_id, name=None):
+        return self._user
+
+    def add_money(self, chat_id, user_id, delta):
+        pass
+
+    def add_win(self, chat_id, user_id):
+        pass
+
+    def add_game(self, chat_id):
+        pass
+
+    def add_user_game(self, chat_id, user_id):
+        pass
+
+    def save(self):
+        pass
+
+    def __getattr__(self, name):
+        # Новые методы Storage, которые может дёргать движок, — тоже no-op
+        return lambda *args, **kwargs: None
+
+
+def make_game(players: int, dealt: bool = True) -> Game:
+    g = Game()
+    # На больших столах одной колоды не хватит — берём несколько
+    decks = max(1, (players + 1) * 6 // 52 + 1)
+    g.deck = new_deck() * decks
+    random.shuffle(g.deck)
+    for uid in range(players):
+        g.add_player(uid, f"Player{uid}")
+    if dealt:
+        g.started = True
+        g.deal_initial()
+    return g
+
+
+def _measure(func, prepare, number):
+    """Время одного вызова func(item) в нс; prepare() готовит item вне замера."""
+    items = [prepare() for _ in range(number)]
+    start = time.perf_counter_ns()
+    for item in items:
+        func(item)
+    return (time.perf_counter_ns() - start) / number
+
+
+def bench_cases():
+    hand = [Card("A", "♠️"), Card("7", "♥️"), Card("A", "♦️"), Card("9", "♣️")]
+    cases = [
+        ("new_deck+shuffle", lambda _: random.shuffle(new_deck()), lambda: None),
+        ("hand_value", lambda h: hand_value(h), lambda: hand),
+        ("fmt_hand", lambda h: fmt_hand(h), lambda: hand),
+        ("deal_initial[2]", lambda g: g.deal_initial(), lambda: make_game(2, dealt=False)),
+        ("hit", lambda g: g.hit(0), lambda: make_game(2)),
+        ("dealer_play", lambda g: g.dealer_play(), lambda: make_game(2)),
+    ]
+    for n in (2, 10, 50):
+        table = make_game(n)
+        cases.append((f"Game.results[{n}]", lambda g: g.results(0, price=20), lambda t=table: t))
+    return cases
+
+
+def run(number: int, repeat: int, only=None):
+    saved = game.storage
+    game.storage = _NullStorage()
+    try:
+        results = {}
+        for name, func, prepare in bench_cases():
+            if only and not any(o in name for o in only):
+                continue
+            runs = [_measure(func, prepare, number) for _ in range(repeat)]
+            results[name] = {"min_ns": min(runs), "median_ns": statistics.median(runs)}
+        return results
+    finally:
+        game.storage = saved
+
+
+def fmt_ns(ns):
+    if ns >= 1e6:
+        return f"{ns / 1e6:8.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:8.2f} µs"
+    return f"{ns:8.0f} ns"
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Микробенчмарки движка game.py")
+    p.add_argument("-n", "--number", type=int, default=2000, help="вызовов в одном замере")
+    p.add_argument("-r", "--repeat", type=int, default=5, help="число замеров (берётся минимум)")
+    p.add_argument("-k", "--only", action="append", help="фильтр по имени бенчмарка")
+    p.add_argument("--json", help="сохранить результаты в JSON")
+    p.add_argument("--compare", help="сравнить с ранее сохранённым JSON")
+    p.add_argument("--seed", type=int, default=0, help="seed для random")
+    args = p.parse_args(argv)
+
+    random.seed(args.seed)
+    results = run(args.number, args.repeat, args.only)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    print(f"{'benchmark':<20} {'min':>11} {'median':>11}" + ("   vs base" if baseline else ""))
+    for name, r in results.items():
+        line = f"{name:<20} {fmt_ns(r['min_ns']):>11} {fmt_ns(r['median_ns']):>11}"
+        base = baseline.get(name)
+        if base:
+            change = (r["min_ns"] - base["min_ns"]) / base["min_ns"] * 100
+            line += f"   {change:+6.1f}%"
+        print(line)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "number": args.number,
+                "repeat": args.repeat,
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import asyncio, csv
+from tenant import conf
+from storage import storage
+
+# Колонки выгрузки балансов
+EXPORT_FIELDS = ["chat", "user", "name", "money", "wins", "games"]
+
+
+async def airdrop(chat_id: int, amount: int, on_progress=None):
+    """Начислить amount всем игрокам чата в storage. Возвращает (начислено, в архиве).
+
+    Игроки из холодного архива не поднимаются — их число возвращается,
+    чтобы сказать об этом в ответе. Каждые BULK_PROGRESS_EVERY игроков
+    вызывается on_progress(начислено); storage сохраняется один раз в конце.
+    """
+    uids = [int(uid) for uid in storage.chat_stats(chat_id)["users"]]
+    for n, uid in enumerate(uids, 1):
+        storage.add_money(chat_id, uid, amount)
+        if n % conf.BULK_PROGRESS_EVERY == 0:
+            if on_progress:
+                await on_progress(n)
+            await asyncio.sleep(0)
+    if uids:
+        storage.save()
+    return len(uids), storage.archived_count(chat_id)
+
+
+def _parse_row(row, default_chat):
+    """(chat, user, delta) из строки CSV или None, если строка негодная."""
+    if len(row) < 3:
+        return None
+    chat, user, delta = (x.strip() for x in row[:3])
+    try:
+        return (int(chat) if chat else default_chat, int(user), int(delta))
+    except ValueError:
+        return None
+
+
+async def read_deltas(path: str, default_chat: int, on_progress=None):
+    """Прочитать CSV (chat,user,delta) потоково в пачку {(chat, user): [сумма, строк]}.
+
+    storage не трогается: каждые BULK_PROGRESS_EVERY строк вызывается
+    on_progress(прочитано) и управление отдаётся event loop. Возвращает
+    (пачка, пропущено строк).
+    """
+    deltas, skipped = {}, 0
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for n, row in enumerate(csv.reader(f), 1):
+            parsed = _parse_row(row, default_chat)
+            if parsed is None:
+                # Заголовок и битые строки просто пропускаем
+                skipped += 1
+            else:
+                chat_id, user_id, delta = parsed
+                entry = deltas.setdefault((chat_id, user_id), [0, 0])
+                entry[0] += delta
+                entry[1] += 1
+            if n % conf.BULK_PROGRESS_EVERY == 0:
+                if on_progress:
+                    await on_progress(n)
+                await asyncio.sleep(0)
+    return deltas, skipped
+
+
+def apply_deltas(deltas: dict):
+    """Применить пачку одним синхронным шагом и одной записью storage.
+
+    Между проверкой и записью нет await: другой обработчик не увидит и не
+    сохранит импорт наполовину. Строки для чатов и игроков, которых нет в
+    storage (и в архиве), пропускаются — импорт не заводит пустых записей.
+    Проверка ничего не меняет; из архива поднимаются только игроки,
+    которым действительно начисляется дельта.
+    Возвращает (применено строк, пропущено строк).
+    """
+    known, skipped = [], 0
+    for (chat_id, user_id), (delta, rows) in deltas.items():
+        if not storage.has_user(chat_id, user_id):
+            skipped += rows
+        else:
+            known.append((chat_id, user_id, delta, rows))
+    for chat_id, user_id, delta, _ in known:
+        storage.add_money(chat_id, user_id, delta)
+    if known:
+        storage.save()
+    return sum(rows for *_, rows in known), skipped
+
+
+async def import_csv(path: str, default_chat: int, on_progress=None):
+    """Импорт CSV: сначала вся пачка читается и проверяется, потом применяется целиком.
+
+    Возвращает (применено, пропущено) строк.
+    """
+    deltas, bad = await read_deltas(path, default_chat, on_progress)
+    applied, unknown = apply_deltas(deltas)
+    return applied, bad + unknown
+
+
+async def export_csv(path: str, chat_id: int | None = None, on_progress=None) -> int:
+    """Выгрузить балансы (одного чата или всех) в CSV, строка за строкой."""
+    rows = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_FIELDS)
+        for cid, uid, user in storage.iter_users(chat_id):
+            writer.writerow([cid, uid, storage.name(uid), user.get("money", 0),
+                             user.get("wins", 0), user.get("games", 0)])
+            rows += 1
+            if rows % conf.BULK_PROGRESS_EVERY == 0:
+                if on_progress:
+                    await on_progress(rows)
+                await asyncio.sleep(0)
+    return rows
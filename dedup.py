@@ -0,0 +1,117 @@
+# dedup.py
+"""Отсев дублей callback-запросов (двойные нажатия и повторы доставки Telegram)."""
+
+import functools
+import time
+from collections import OrderedDict
+
+import metrics
+
+DUPLICATE_CALLBACKS = metrics.Counter(
+    "bot_callback_duplicates_total", "Отброшенные дубли callback-запросов", ("handler",)
+)
+
+
+class TTLCache:
+    """Множество ключей с одинаковым временем жизни.
+
+    TTL у всех ключей один, поэтому порядок вставки совпадает с порядком
+    истечения — просроченные ключи снимаются с начала OrderedDict.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 100_000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def _purge(self, now):
+        items = self._items
+        while items:
+            key, expires = next(iter(items.items()))
+            if expires > now and len(items) <= self.maxsize:
+                break
+            items.popitem(last=False)
+
+    def add(self, key):
+        now = time.monotonic()
+        self._items[key] = now + self.ttl
+        self._items.move_to_end(key)
+        self._purge(now)
+
+    def __contains__(self, key):
+        expires = self._items.get(key)
+        return expires is not None and expires > time.monotonic()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class CallbackDeduper:
+    """Пропускает callback только один раз.
+
+    Дублем считается:
+    * тот же callback query id (повторная доставка от Telegram);
+    * то же действие того же игрока на том же сообщении в том же состоянии,
+      пока первое ещё обрабатывается или уже обработано (двойное нажатие).
+    Состояние сообщения — его текст: после «Взять карту» текст меняется,
+    поэтому следующий честный ход не совпадает с предыдущим.
+    """
+
+    def __init__(self, query_ttl: float, action_ttl: float):
+        self.queries = TTLCache(query_ttl)
+        self.actions = TTLCache(action_ttl)
+        self.in_flight = set()
+
+    @staticmethod
+    def action_key(query):
+        msg = query.message
+        if msg is not None:
+            chat_id = msg.chat.id
+            message_id = msg.message_id
+            state = hash(getattr(msg, "text", None))
+        else:
+            chat_id, message_id, state = None, query.inline_message_id, None
+        return (query.from_user.id, chat_id, message_id, query.data, state)
+
+    def claim(self, query, remember: bool = True) -> bool:
+        """True — обрабатывать; False — это дубль."""
+        if query.id in self.queries:
+            return False
+        self.queries.add(query.id)
+        key = self.action_key(query)
+        if key in self.in_flight or (remember and key in self.actions):
+            return False
+        self.in_flight.add(key)
+        return True
+
+    def release(self, query, remember: bool = True):
+        key = self.action_key(query)
+        self.in_flight.discard(key)
+        if remember:
+            self.actions.add(key)
+
+
+def dedup_callback(deduper: CallbackDeduper, remember: bool = True):
+    """Декоратор для CallbackQueryHandler: дубли гасятся без вызова обработчика.
+
+    remember=False — отсекать только повторы id и нажатия во время обработки
+    (для кнопок, которые можно честно нажать ещё раз, например Join).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(update, context):
+            query = update.callback_query
+            if not deduper.claim(query, remember):
+                DUPLICATE_CALLBACKS.inc(func.__name__)
+                try:
+                    # Снимаем «часики» с кнопки, больше ничего не отправляем
+                    await query.answer()
+                except Exception:
+                    pass
+                return
+            try:
+                return await func(update, context)
+            finally:
+                deduper.release(query, remember)
+        return wrapper
+    return decorator
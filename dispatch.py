@@ -0,0 +1,143 @@
+# dispatch.py
+"""Приоритетная обработка апдейтов: ходы в играх не стоят в очереди за /top.
+
+Апдейт попадает в одну из полос (LANES) по типу. Свободный обработчик
+всегда берёт апдейт из самой приоритетной непустой полосы, а один
+обработчик зарезервирован за игровой полосой: медленные /importcsv или
+/top не займут все слоты. Очереди нижних полос ограничены: при
+переполнении новый апдейт отбрасывается (метрика
+bot_updates_dropped_total), игровые не отбрасываются никогда.
+"""
+
+import asyncio
+import time
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor
+
+import metrics
+
+# Полосы по убыванию приоритета
+LANES = ("game", "control", "read")
+
+# Кнопки, от которых зависит ход игры (cb_join, cb_action)
+GAME_CALLBACKS = ("join",)
+GAME_CALLBACK_PREFIXES = ("hit:", "stand:")
+# Команды админа и настройки — важнее чтения, но не важнее ходов
+CONTROL_COMMANDS = {
+    "newgame", "setup", "stop", "addmoney", "airdrop", "importcsv", "exportcsv", "profile",
+}
+
+QUEUE_DEPTH = metrics.Gauge("bot_update_queue_depth", "Апдейты, ждущие обработчика", ("lane",))
+QUEUE_WAIT = metrics.Histogram("bot_update_wait_seconds", "Ожидание апдейта в очереди", ("lane",))
+DROPPED = metrics.Counter("bot_updates_dropped_total", "Апдейты, отброшенные из-за переполнения очереди", ("lane",))
+
+
+def update_lane(update) -> str:
+    query = getattr(update, "callback_query", None)
+    if query is not None:
+        data = query.data or ""
+        if data in GAME_CALLBACKS or data.startswith(GAME_CALLBACK_PREFIXES):
+            return "game"
+        return "control"
+    if getattr(update, "my_chat_member", None) is not None:
+        # Бота удалили из чата: игру надо снять и вернуть ставки — терять нельзя
+        return "game"
+    message = getattr(update, "message", None)
+    text = getattr(message, "text", None) or ""
+    if text.startswith("/"):
+        command = text[1:].split(maxsplit=1)[0].split("@", 1)[0].lower() if len(text) > 1 else ""
+        if command in CONTROL_COMMANDS:
+            return "control"
+    return "read"
+
+
+class PriorityUpdateProcessor(BaseUpdateProcessor):
+    """Не больше workers апдейтов одновременно; очередь к ним — по полосам.
+
+    Семафор базового класса пропускает апдейты в порядке поступления,
+    поэтому ему дан большой запас (max_pending), а реальный лимит
+    параллельности и порядок выбора держим сами.
+    """
+
+    def __init__(self, workers: int, limits: dict, max_pending: int = 10_000):
+        super().__init__(max_concurrent_updates=max_pending)
+        self.workers = workers
+        self.limits = limits                    # полоса → макс. длина очереди (нет в словаре — без лимита)
+        self._queues = {lane: deque() for lane in LANES}
+        self._active = 0
+        self._active_other = 0                  # из них заняты не игровыми полосами
+        # Не игровым полосам — на один слот меньше (при единственном обработчике резерва нет)
+        self.other_limit = max(1, workers - 1)
+
+    @property
+    def pending(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _free(self, lane: str) -> bool:
+        if self._active >= self.workers:
+            return False
+        return lane == "game" or self._active_other < self.other_limit
+
+    def _take(self, lane: str):
+        self._active += 1
+        if lane != "game":
+            self._active_other += 1
+
+    async def _acquire(self, lane: str):
+        if not self.pending and self._free(lane):
+            self._take(lane)
+            QUEUE_WAIT.observe(0.0, lane)
+            return True
+        queue = self._queues[lane]
+        limit = self.limits.get(lane)
+        if limit is not None and len(queue) >= limit:
+            DROPPED.inc(lane)
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append((waiter, time.perf_counter()))
+        QUEUE_DEPTH.set(len(queue), lane)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Слот уже передан нам — вернуть его следующему
+                self._release(lane)
+            raise
+        return True
+
+    def _release(self, lane: str):
+        self._active -= 1
+        if lane != "game":
+            self._active_other -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Раздать свободные слоты ожидающим, начиная с самой приоритетной полосы."""
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue and self._free(lane):
+                waiter, enqueued = queue.popleft()
+                QUEUE_DEPTH.set(len(queue), lane)
+                if waiter.done():
+                    continue    # отменён при остановке
+                QUEUE_WAIT.observe(time.perf_counter() - enqueued, lane)
+                self._take(lane)
+                waiter.set_result(None)
+
+    async def do_process_update(self, update, coroutine):
+        lane = update_lane(update)
+        if not await self._acquire(lane):
+            coroutine.close()
+            return
+        try:
+            await coroutine
+        finally:
+            self._release(lane)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -1,27 +1,27 @@
 
 import time
-import settings
+from tenant import conf
 from storage import storage
 
-def give_daily(chat_id: int, user_id: int):
+def give_daily(chat_id: int, user_id: int, name: str | None = None):
     now = time.time()
-    user = storage.get_user(chat_id, user_id)
+    user = storage.get_user(chat_id, user_id, name)
     delta_h = (now - user["last_daily"]) / 3600
-    if delta_h < settings.DAILY_COOLDOWN_HOURS:
-        return False, round(settings.DAILY_COOLDOWN_HOURS - delta_h, 1)
-    storage.add_money(chat_id, user_id, settings.DAILY_BONUS)
+    if delta_h < conf.DAILY_COOLDOWN_HOURS:
+        return False, round(conf.DAILY_COOLDOWN_HOURS - delta_h, 1)
+    storage.add_money(chat_id, user_id, conf.DAILY_BONUS)
     storage.set_daily(chat_id, user_id, now)
     storage.save()
     return True, 0
 
 def reward_player(chat_id: int, user_id: int, outcome: str):
     if outcome == "win":
-        delta = settings.WIN_REWARD
+        delta = conf.WIN_REWARD
         storage.add_win(chat_id, user_id)
     elif outcome == "draw":
-        delta = settings.DRAW_REWARD
+        delta = conf.DRAW_REWARD
     else:
-        delta = settings.LOSE_PENALTY
+        delta = conf.LOSE_PENALTY
     storage.add_money(chat_id, user_id, delta)
     storage.save()
     return delta
@@ -1,5 +1,6 @@
 # game.py
 import random
+import uuid
 from collections import namedtuple
 from storage import storage
 
@@ -33,16 +34,19 @@ def fmt_hand(hand):
 # Собственно класс игры
 class Game:
     def __init__(self):
+        self.id = uuid.uuid4().hex[:12]   # для логов и истории
         self.deck = new_deck()
         random.shuffle(self.deck)
-        self.players = {}      # uid → {name, hand, stand, bust}
+        self.players = {}      # uid → {name, hand, stand, bust, timed_out}
         self.dealer = []
         self.started = False
+        self.outcomes = {}     # uid → (score, outcome, delta), заполняется в results()
+        self.bank = 0
 
     def add_player(self, uid, name):
         if self.started or uid in self.players:
             return False
-        self.players[uid] = {"name": name, "hand": [], "stand": False, "bust": False}
+        self.players[uid] = {"name": name, "hand": [], "stand": False, "bust": False, "timed_out": False}
         return True
 
     def deal_initial(self):
@@ -116,6 +120,7 @@ class Game:
                 delta = 0
 
             score = hand_value(p["hand"])
+            self.outcomes[uid] = (score, outcome, delta)
             name = p["name"]
             sign = "+" if delta > 0 else ""
             delta_str = f"{sign}{delta}" if delta != 0 else "0"
@@ -123,10 +128,11 @@ class Game:
                 f"{name}: {fmt_hand(p['hand'])} ({score}) → {outcome.upper()} ({delta_str} фишек)"
             )
 
-        lines.append(f"\n💰 Банк: {(len(self.players) + 1) * price}💳")
+        self.bank = (len(self.players) + 1) * price
+        lines.append(f"\n💰 Банк: {self.bank}💳")
 
         for uid in self.players:
-            storage.get_user(chat_id, uid)['games'] += 1
+            storage.add_user_game(chat_id, uid)
         storage.add_game(chat_id)
         storage.save()
         return "\n".join(lines)
\ No newline at end of file
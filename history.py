@@ -0,0 +1,177 @@
+import json, os, time
+import settings
+from game import hand_value
+from tenant import TenantLocal, conf
+
+# Буквенные коды исходов в компактной записи
+OUTCOME_CODES = {"win": "w", "lose": "l", "draw": "d"}
+PERIODS = ("day", "week")
+
+
+def period_key(period: str, ts: float) -> str:
+    t = time.localtime(ts)
+    if period == "day":
+        return time.strftime("%Y-%m-%d", t)
+    year, week, _ = time.strftime("%G %V %u", t).split()
+    return f"{year}-W{week}"
+
+
+class GameHistory:
+    """История сыгранных игр + инкрементальные сводки по дням и неделям.
+
+    Каждая игра — одна компактная строка JSON в сегменте `<месяц>.jsonl`
+    (только дозапись). Сводки обновляются в памяти при каждой записи,
+    поэтому /stats и топ за период не читают историю; в `rollups.json` они
+    сбрасываются раз в HISTORY_FLUSH_INTERVAL секунд вместе с позицией в
+    истории ("upto"), после которой при запуске догоняются по сегментам.
+    """
+
+    def __init__(self, directory: str = settings.HISTORY_DIR):
+        self.directory = directory
+        self.rollups_path = os.path.join(directory, 'rollups.json')
+        self._rollups = {p: {} for p in PERIODS}
+        self._dirty = False
+        self.load()
+
+    # --- File IO --------------------------------------------------------
+    def load(self):
+        if not os.path.exists(self.rollups_path):
+            # rollups.json потерян или ещё не создан — считаем из истории
+            self.rebuild_rollups()
+            return
+        with open(self.rollups_path, 'r', encoding='utf-8') as f:
+            self._rollups = json.load(f)
+        for p in PERIODS:
+            self._rollups.setdefault(p, {})
+        if "upto" not in self._rollups:
+            # Старый формат писался после каждой игры — догонять нечего
+            self._rollups["upto"] = self._end()
+        # Игры, записанные после последнего сброса сводок (бот остановился раньше)
+        elif self._replay(self._rollups["upto"]):
+            self.save_rollups()
+
+    def save_rollups(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.rollups_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._rollups, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, self.rollups_path)
+        self._dirty = False
+
+    def flush(self):
+        """Записать сводки, если они изменились (задача JobQueue и остановка бота)."""
+        if self._dirty:
+            self.save_rollups()
+
+    def segment_path(self, ts: float) -> str:
+        return os.path.join(self.directory, time.strftime("%Y-%m", time.localtime(ts)) + '.jsonl')
+
+    def _end(self):
+        """Позиция конца истории: [последний сегмент, его размер] или None."""
+        if not os.path.isdir(self.directory):
+            return None
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith('.jsonl'))
+        if not names:
+            return None
+        return [names[-1], os.path.getsize(os.path.join(self.directory, names[-1]))]
+
+    def iter_records(self, since=None):
+        """Записи по порядку (для выгрузок и пересчёта сводок): (запись, [сегмент, байт после неё]).
+
+        since — позиция [сегмент, байт], с которой продолжить.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.jsonl') or (since and name < since[0]):
+                continue
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                if since and name == since[0]:
+                    f.seek(since[1])
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line), [name, f.tell()]
+
+    # --- Запись ---------------------------------------------------------
+    def record(self, chat_id: int, game, price: int, ts: float | None = None):
+        """Сохранить итог игры (после Game.results) и обновить сводки."""
+        ts = time.time() if ts is None else ts
+        uids = list(game.outcomes)
+        # Колонки вместо списка словарей: uid, очки, исход, выигрыш
+        rec = {
+            "id": game.id,
+            "t": int(ts),
+            "c": chat_id,
+            "price": price,
+            "bank": game.bank,
+            "dealer": hand_value(game.dealer),
+            "u": uids,
+            "s": [game.outcomes[u][0] for u in uids],
+            "o": "".join(OUTCOME_CODES[game.outcomes[u][1]] for u in uids),
+            "x": [game.outcomes[u][2] for u in uids],
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.segment_path(ts)
+        with open(path, 'ab') as f:
+            f.write((json.dumps(rec, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8'))
+            upto = [os.path.basename(path), f.tell()]
+
+        self._apply(rec)
+        self._prune(ts)
+        # На диск — из периодической задачи (flush), не после каждой игры
+        self._rollups["upto"] = upto
+        self._dirty = True
+        return rec
+
+    def _apply(self, rec):
+        for period in PERIODS:
+            bucket = self._rollups[period].setdefault(period_key(period, rec["t"]), {})
+            chat = bucket.setdefault(str(rec["c"]), {"games": 0, "users": {}})
+            chat["games"] += 1
+            for uid, code, delta in zip(rec["u"], rec["o"], rec["x"]):
+                u = chat["users"].setdefault(str(uid), {"games": 0, "wins": 0, "net": 0})
+                u["games"] += 1
+                if code == "w":
+                    u["wins"] += 1
+                # Ставка уже списана при Join, чистый результат = выплата − ставка
+                u["net"] += delta - rec["price"]
+
+    def _prune(self, now: float):
+        limits = {"day": conf.HISTORY_KEEP_DAYS, "week": conf.HISTORY_KEEP_WEEKS}
+        for period, keep in limits.items():
+            step = 86400 if period == "day" else 7 * 86400
+            oldest = period_key(period, now - (keep - 1) * step)
+            for key in [k for k in self._rollups[period] if k < oldest]:
+                del self._rollups[period][key]
+
+    def _replay(self, since) -> int:
+        """Применить к сводкам записи истории после позиции since. Возвращает их число."""
+        count = 0
+        for rec, upto in self.iter_records(since):
+            self._apply(rec)
+            self._rollups["upto"] = upto
+            count += 1
+        if count:
+            self._prune(time.time())
+        return count
+
+    def rebuild_rollups(self):
+        """Пересчитать сводки из истории (если rollups.json потерян)."""
+        self._rollups = {p: {} for p in PERIODS}
+        self._replay(None)
+        self.save_rollups()
+
+    # --- Queries --------------------------------------------------------
+    def period_stats(self, chat_id: int, period: str, ts: float | None = None):
+        ts = time.time() if ts is None else ts
+        bucket = self._rollups[period].get(period_key(period, ts), {})
+        return bucket.get(str(chat_id), {"games": 0, "users": {}})
+
+    def period_leaderboard(self, chat_id: int, period: str, key: str = "net", limit: int = 5):
+        users = self.period_stats(chat_id, period)["users"]
+        ranked = sorted(users.items(), key=lambda kv: kv[1].get(key, 0), reverse=True)
+        return [(int(uid), stats) for uid, stats in ranked[:limit]]
+
+
+# Singleton instance (в мультибот-режиме — история текущего бота, см. tenant.py)
+history = TenantLocal("history", GameHistory)
@@ -0,0 +1,112 @@
+import bisect
+
+# Поля, по которым ведётся глобальный рейтинг
+KEYS = ("money", "wins", "games")
+
+
+class RankIndex:
+    """Отсортированный индекс (значение → игрок) с быстрым top-K и поиском места.
+
+    Храним пары (-value, uid) в отсортированном списке: обновление —
+    два бинарных поиска и сдвиг памяти, top-K — срез, место — bisect.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._order = []
+
+    def __len__(self):
+        return len(self._order)
+
+    def set(self, uid: int, value: int):
+        old = self._values.get(uid)
+        if old == value:
+            return
+        if old is not None:
+            i = bisect.bisect_left(self._order, (-old, uid))
+            del self._order[i]
+        self._values[uid] = value
+        bisect.insort(self._order, (-value, uid))
+
+    def remove(self, uid: int):
+        old = self._values.pop(uid, None)
+        if old is not None:
+            i = bisect.bisect_left(self._order, (-old, uid))
+            del self._order[i]
+
+    def get(self, uid: int, default=None):
+        return self._values.get(uid, default)
+
+    def top(self, limit: int):
+        return [(uid, -neg) for neg, uid in self._order[:limit]]
+
+    def rank(self, uid: int):
+        """Место игрока (1 — первый) или None, если его нет в рейтинге."""
+        value = self._values.get(uid)
+        if value is None:
+            return None
+        return bisect.bisect_left(self._order, (-value, uid)) + 1
+
+
+class GlobalLeaderboard:
+    """Сумма money/wins/games игрока по всем чатам, обновляется по дельтам."""
+
+    def __init__(self, profiles: dict | None = None):
+        self.indexes = {key: RankIndex() for key in KEYS}
+        self.profiles = profiles if profiles is not None else {}   # общие со storage, имена берём оттуда
+        self.members = {}   # uid → в скольких чатах есть запись
+
+    @classmethod
+    def from_chats(cls, chats: dict, profiles: dict | None = None):
+        """Собрать рейтинг один раз при загрузке storage."""
+        board = cls(profiles)
+        totals = {}
+        for chat in chats.values():
+            if not isinstance(chat, dict):
+                continue
+            for uid_str, user in chat.get("users", {}).items():
+                uid = int(uid_str)
+                t = totals.setdefault(uid, dict.fromkeys(KEYS, 0))
+                for key in KEYS:
+                    t[key] += user.get(key, 0)
+                board.members[uid] = board.members.get(uid, 0) + 1
+        for uid, t in totals.items():
+            for key in KEYS:
+                board.indexes[key].set(uid, t[key])
+        return board
+
+    def add(self, uid: int, key: str, delta: int):
+        index = self.indexes[key]
+        index.set(uid, index.get(uid, 0) + delta)
+
+    def join(self, uid: int, user: dict):
+        """Запись игрока в одном из чатов появилась в storage (новая или из архива)."""
+        self.members[uid] = self.members.get(uid, 0) + 1
+        for key in KEYS:
+            self.add(uid, key, user.get(key, 0))
+
+    def leave(self, uid: int, user: dict):
+        """Запись игрока ушла из storage (в архив); без записей игрок выпадает из рейтинга."""
+        left = self.members.get(uid, 1) - 1
+        if left > 0:
+            self.members[uid] = left
+            for key in KEYS:
+                self.add(uid, key, -user.get(key, 0))
+            return
+        self.members.pop(uid, None)
+        for index in self.indexes.values():
+            index.remove(uid)
+
+    def top(self, key: str = "money", limit: int = 10):
+        return [
+            {"user_id": uid, "name": self.profiles.get(str(uid), {}).get("name", "Anon"), key: value}
+            for uid, value in self.indexes[key].top(limit)
+        ]
+
+    def rank(self, uid: int, key: str = "money"):
+        """(место, значение, всего игроков) или None."""
+        index = self.indexes[key]
+        place = index.rank(uid)
+        if place is None:
+            return None
+        return place, index.get(uid), len(index)
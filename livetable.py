@@ -0,0 +1,169 @@
+# livetable.py
+"""Живой стол в группе: статусы игроков и открытая карта дилера во время раздачи.
+
+Ходы (cb_action) и таймауты (player_timeout) только помечают стол
+изменённым; сообщение правится не чаще раза в LIVE_TABLE_EDIT_INTERVAL
+секунд и показывает состояние на момент правки — сколько бы ходов ни
+случилось за интервал, это один edit_message_text. Карты игроков в
+группе не раскрываются: они приходят в личку.
+"""
+
+import asyncio
+import logging
+import time
+
+from telegram.error import RetryAfter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+EDITS = metrics.Counter("bot_live_table_edits_total", "Правки сообщения живого стола")
+MERGED = metrics.Counter("bot_live_table_merged_total", "Изменения стола, слитые в уже запланированную правку")
+
+STATUS_PLAYING = "▶️ играет"
+STATUS_STOOD = "✋ остановился"
+STATUS_BUST = "💥 перебор"
+STATUS_TIMED_OUT = "⏰ время вышло"
+
+
+def player_status(p: dict) -> str:
+    if p.get("timed_out"):
+        return STATUS_TIMED_OUT
+    if p["bust"]:
+        return STATUS_BUST
+    if p["stand"]:
+        return STATUS_STOOD
+    return STATUS_PLAYING
+
+
+# Telegram считает длину текста в UTF-16; 4096 — предел сообщения
+MESSAGE_LIMIT = 4096
+NAME_LIMIT = 24           # имя в Telegram может быть до 128 символов
+
+
+def _units(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _short(name: str) -> str:
+    return name if len(name) <= NAME_LIMIT else name[:NAME_LIMIT - 1] + "…"
+
+
+def table_text(game, max_players: int) -> str:
+    up = game.dealer[0]
+    players = list(game.players.values())
+    done = sum(1 for p in players if p["stand"])
+    lines = [f"🃏 Стол · ходы сделали {done}/{len(players)}",
+             f"Дилер: {up.rank}{up.suit} 🂠", ""]
+    # Запас под итоговую строку «… и ещё N»
+    budget = MESSAGE_LIMIT - 64 - sum(_units(line) + 1 for line in lines)
+    shown = 0
+    for p in players[:max_players]:
+        line = f"{_short(p['name'])} — {player_status(p)}, карт: {len(p['hand'])}"
+        cost = _units(line) + 1
+        if cost > budget:
+            break
+        budget -= cost
+        lines.append(line)
+        shown += 1
+    if shown < len(players):
+        # Остальные — одной строкой, чтобы сообщение влезло в лимит
+        rest = players[shown:]
+        playing = sum(1 for p in rest if not p["stand"])
+        lines.append(f"… и ещё {len(rest)} игроков, ходят: {playing}")
+    return "\n".join(lines)
+
+
+class _Table:
+    __slots__ = ("message_id", "game", "text", "last_edit", "task")
+
+    def __init__(self, message_id, game, text):
+        self.message_id = message_id
+        self.game = game
+        self.text = text          # что сейчас в сообщении
+        self.last_edit = time.monotonic()
+        self.task = None          # запланированная правка
+
+
+class LiveTables:
+    """Сообщения живого стола по чатам и отложенная правка каждого из них."""
+
+    def __init__(self, interval: float, max_players: int):
+        self.interval = interval
+        self.max_players = max_players
+        self._tables = {}         # (bot.id, chat_id) → _Table
+
+    async def open(self, context, chat_id: int, game):
+        """Отправить сообщение стола после раздачи; ошибка отправки игру не прерывает."""
+        text = table_text(game, self.max_players)
+        try:
+            msg = await context.bot.send_message(chat_id, text)
+        except Exception:
+            # Без стола игра идёт как обычно: ходы в личке, итоги в группе
+            logger.exception("Failed to post live table in %s", chat_id,
+                             extra={"group_id": chat_id, "game_id": game.id})
+            return
+        self._tables[(context.bot.id, chat_id)] = _Table(msg.message_id, game, text)
+
+    def has(self, context, chat_id: int) -> bool:
+        """Стол в чате опубликован (open мог не отправить сообщение)."""
+        return (context.bot.id, chat_id) in self._tables
+
+    def update(self, context, chat_id: int):
+        """Стол изменился: запланировать правку, если она ещё не запланирована."""
+        table = self._tables.get((context.bot.id, chat_id))
+        if table is None:
+            return
+        if table.task is not None:
+            MERGED.inc()
+            return
+        delay = max(0.0, table.last_edit + self.interval - time.monotonic())
+        table.task = context.application.create_task(self._edit_later(context.bot, chat_id, table, delay))
+
+    def close(self, context, chat_id: int):
+        """Игра окончена: вместо отложенной правки — последняя, сразу."""
+        table = self._tables.pop((context.bot.id, chat_id), None)
+        if table is None:
+            return
+        if table.task is not None:
+            table.task.cancel()
+        table.task = context.application.create_task(self._edit_later(context.bot, chat_id, table, 0))
+
+    def discard(self, context, chat_id: int):
+        """Забыть стол без правки (бота удалили из чата)."""
+        table = self._tables.pop((context.bot.id, chat_id), None)
+        if table is not None and table.task is not None:
+            table.task.cancel()
+
+    async def _edit_later(self, bot, chat_id: int, table: _Table, delay: float):
+        while True:
+            if delay:
+                await asyncio.sleep(delay)
+            # Текст строится сейчас: в него попадают все изменения, накопленные за delay;
+            # изменения во время самого запроса запланируют следующую правку
+            table.task = None
+            text = table_text(table.game, self.max_players)
+            if text == table.text:
+                return
+            try:
+                await bot.edit_message_text(chat_id=chat_id, message_id=table.message_id, text=text)
+            except RetryAfter as e:
+                # Повторить не раньше, чем разрешит Telegram
+                delay = e.retry_after
+                delay = delay.total_seconds() if hasattr(delay, "total_seconds") else float(delay)
+                table.last_edit = time.monotonic() + delay - self.interval
+                logger.warning("Live table edit in %s throttled for %ss", chat_id, delay,
+                               extra={"group_id": chat_id, "game_id": table.game.id})
+                if table.task is not None:
+                    return
+                table.task = asyncio.current_task()
+                continue
+            except Exception:
+                logger.exception("Failed to edit live table in %s", chat_id,
+                                 extra={"group_id": chat_id, "game_id": table.game.id})
+                return
+            EDITS.inc()
+            table.text = text
+            table.last_edit = time.monotonic()
+            return
@@ -0,0 +1,392 @@
+# loadtest.py
+"""Нагрузочный тест: настоящий main.py против локального фейкового Bot API.
+
+Фейковый сервер отвечает на getUpdates/sendMessage/... как Telegram, а
+симулированные группы и игроки проходят весь цикл игры: /newgame (или
+автозапуск) → Join → hit/stand в личке → таймауты → подведение итогов.
+
+    python loadtest.py --groups 20 --players 5 --think 0.3 --games 3
+    python loadtest.py --groups 5 --players 10 --autogame --afk 0.2
+
+Отчёт: игры в секунду, p50/p99 задержки обработки апдейтов и число
+вызовов Bot API на одну игру.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from urllib.parse import parse_qs
+
+BOT_ID = 42
+ADMIN_ID = 1
+TOKEN = f"{BOT_ID}:LOADTEST"
+SCORE_RE = re.compile(r"\((\d+)\)")
+
+# Служебные методы, которые не считаются «вызовами на игру»
+SERVICE_METHODS = {"getUpdates", "getMe", "deleteWebhook", "close", "logOut"}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+class FakeBotAPI:
+    """Минимальный HTTP-сервер, изображающий Telegram Bot API."""
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.server = None
+        self.base_url = None
+        self.calls = Counter()
+        self._updates = []
+        self._next_update_id = 1
+        self._new_update = asyncio.Event()
+        self._message_ids = defaultdict(int)
+        self.texts = {}              # (chat_id, message_id) → текущий текст сообщения
+
+    # --- HTTP -----------------------------------------------------------
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self._serve, host, port)
+        port = self.server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}/bot"
+        return self.base_url
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                _, path, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, v = h.decode("latin-1").split(":", 1)
+                    headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                params = self._parse_params(headers.get("content-type", ""), body)
+                result = await self.dispatch(path.rsplit("/", 1)[-1], params)
+                payload = json.dumps({"ok": True, "result": result}).encode("utf-8")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n" % len(payload) + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Клиент ушёл или тест завершается — висящий long-poll просто закрываем
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse_params(content_type, body):
+        if not content_type.startswith("application/x-www-form-urlencoded"):
+            # multipart (файлы) нам не интересен — отвечаем по умолчанию
+            return {}
+        params = {k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()}
+        for key in ("reply_markup",):
+            if key in params:
+                params[key] = json.loads(params[key])
+        return params
+
+    # --- Bot API --------------------------------------------------------
+    def push_update(self, update):
+        update["update_id"] = self._next_update_id
+        self._next_update_id += 1
+        self._updates.append(update)
+        self._new_update.set()
+
+    def _message(self, chat_id, message_id=None, text=""):
+        if message_id is None:
+            self._message_ids[chat_id] += 1
+            message_id = self._message_ids[chat_id]
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": self.sim.chat(chat_id),
+            "from": self.sim.bot_user,
+            "text": text,
+        }
+
+    async def dispatch(self, method, params):
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "getMe":
+            return dict(self.sim.bot_user, can_join_groups=True,
+                        can_read_all_group_messages=False, supports_inline_queries=False)
+        if method == "sendMessage":
+            chat_id = int(params["chat_id"])
+            msg = self._message(chat_id, text=params.get("text", ""))
+            self.texts[(chat_id, msg["message_id"])] = msg["text"]
+            self.sim.on_bot_message(chat_id, msg["message_id"], params)
+            return msg
+        if method in ("editMessageText", "editMessageReplyMarkup"):
+            chat_id = int(params["chat_id"])
+            message_id = int(params["message_id"])
+            if "text" in params:
+                self.texts[(chat_id, message_id)] = params["text"]
+            self.sim.on_bot_message(chat_id, message_id, params)
+            return self._message(chat_id, message_id, self.texts.get((chat_id, message_id), ""))
+        if method == "answerCallbackQuery":
+            self.sim.on_answer(params.get("callback_query_id"))
+            return True
+        if method in ("sendDocument", "sendPhoto"):
+            return self._message(int(params.get("chat_id", 0) or 0))
+        return True
+
+    async def _get_updates(self, params):
+        offset = int(params.get("offset", 0) or 0)
+        timeout = float(params.get("timeout", 0) or 0)
+        # Подтверждённые апдейты (id < offset) больше не отдаём
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:100]
+
+
+class Simulation:
+    """Группы и игроки, которые «нажимают кнопки» в ответ на сообщения бота."""
+
+    def __init__(self, args):
+        self.args = args
+        self.api = FakeBotAPI(self)
+        self.bot_user = {"id": BOT_ID, "is_bot": True, "first_name": "LoadBot", "username": "loadtest_bot"}
+        self.groups = [-1000000 - g for g in range(args.groups)]
+        self.players = {
+            gid: [2000000 + g * 1000 + i for i in range(args.players)]
+            for g, gid in enumerate(self.groups)
+        }
+        self.afk = {
+            uid for uids in self.players.values() for uid in uids
+            if random.random() < args.afk
+        }
+        self.game_over = {gid: asyncio.Event() for gid in self.groups}
+        self.games_done = 0
+        self.games_cancelled = 0
+        self.latencies = []
+        self._pending = {}           # callback_query_id / ("cmd", chat_id) → время отправки
+        self._next_query_id = 1
+        self._next_user_msg_id = defaultdict(lambda: 100000)
+        self._tasks = set()
+
+    # --- Объекты Telegram ----------------------------------------------
+    def chat(self, chat_id):
+        if chat_id < 0:
+            return {"id": chat_id, "type": "supergroup", "title": f"Load {chat_id}"}
+        return {"id": chat_id, "type": "private", "first_name": f"P{chat_id}"}
+
+    def user(self, uid):
+        return {"id": uid, "is_bot": False, "first_name": f"P{uid}"}
+
+    def send_command(self, chat_id, uid, command):
+        self._next_user_msg_id[chat_id] += 1
+        self._pending[("cmd", chat_id)] = time.perf_counter()
+        self.api.push_update({"message": {
+            "message_id": self._next_user_msg_id[chat_id],
+            "date": int(time.time()),
+            "chat": self.chat(chat_id),
+            "from": self.user(uid),
+            "text": command,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        }})
+
+    def press(self, chat_id, message_id, uid, data):
+        query_id = str(self._next_query_id)
+        self._next_query_id += 1
+        self._pending[query_id] = time.perf_counter()
+        self.api.push_update({"callback_query": {
+            "id": query_id,
+            "from": self.user(uid),
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": self.chat(chat_id),
+                "from": self.bot_user,
+                # Как и Telegram, прикладываем сообщение в его текущем виде
+                "text": self.api.texts.get((chat_id, message_id), ""),
+            },
+        }})
+
+    # --- Реакции на вызовы бота ----------------------------------------
+    def _later(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _think(self):
+        return self.args.think * random.uniform(0.5, 1.5)
+
+    def on_answer(self, query_id):
+        start = self._pending.pop(query_id, None)
+        if start is not None:
+            self.latencies.append(time.perf_counter() - start)
+
+    def on_bot_message(self, chat_id, message_id, params):
+        start = self._pending.pop(("cmd", chat_id), None)
+        if start is not None:
+            self.latencies.append(time.perf_counter() - start)
+
+        text = params.get("text", "")
+        buttons = [
+            b.get("callback_data", "")
+            for row in (params.get("reply_markup") or {}).get("inline_keyboard", [])
+            for b in row
+        ]
+        if chat_id < 0:
+            if "join" in buttons and chat_id in self.players:
+                for uid in self.players[chat_id]:
+                    self._later(self._press_after(chat_id, message_id, uid, "join"))
+            if text.startswith("🃏 Игра окончена"):
+                self.games_done += 1
+                self.game_over[chat_id].set()
+            elif "Игра отменена" in text or "недостаточно игроков" in text:
+                self.games_cancelled += 1
+                self.game_over[chat_id].set()
+        elif any(b.startswith("hit:") for b in buttons) and chat_id not in self.afk:
+            group_id = buttons[0].split(":", 1)[1]
+            m = SCORE_RE.findall(text)
+            score = int(m[-1]) if m else 0
+            action = "hit" if score < self.args.stand_on else "stand"
+            self._later(self._press_after(chat_id, message_id, chat_id, f"{action}:{group_id}"))
+
+    async def _press_after(self, chat_id, message_id, uid, data):
+        await asyncio.sleep(self._think())
+        self.press(chat_id, message_id, uid, data)
+
+    # --- Сценарий -------------------------------------------------------
+    async def drive_group(self, gid):
+        import main
+        for _ in range(self.args.games):
+            self.game_over[gid].clear()
+            if self.args.autogame:
+                main.set_group_setting(gid, 'auto_game_enabled', True)
+                main.schedule_autogame(self.app.job_queue, gid, when=random.uniform(0, self.args.think))
+            else:
+                self.send_command(gid, ADMIN_ID, "/newgame")
+            await self.game_over[gid].wait()
+        if self.args.autogame:
+            main.set_group_setting(gid, 'auto_game_enabled', False)
+            main.cancel_autogame_job(self.app.job_queue, gid)
+
+    async def run(self):
+        import main
+        from storage import storage
+
+        for gid, uids in self.players.items():
+            for uid in uids:
+                storage.get_user(gid, uid, f"P{uid}")
+                storage.add_money(gid, uid, 1_000_000)
+        storage.save()
+
+        await self.api.start()
+        self.app = main.build_application(TOKEN, base_url=self.api.base_url)
+        async with self.app:
+            await self.app.start()
+            await self.app.updater.start_polling(poll_interval=0.0, timeout=1)
+            start = time.perf_counter()
+            await asyncio.gather(*(self.drive_group(gid) for gid in self.groups))
+            elapsed = time.perf_counter() - start
+            await self.app.updater.stop()
+            await self.app.stop()
+        await self.api.stop()
+        for task in list(self._tasks):
+            task.cancel()
+        return elapsed
+
+    def report(self, elapsed):
+        games = self.games_done
+        api_calls = sum(v for k, v in self.api.calls.items() if k not in SERVICE_METHODS)
+        a = self.args
+        lines = [
+            f"Конфигурация: {a.groups} групп × {a.players} игроков, think={a.think}s, "
+            f"afk={a.afk}, игр на группу={a.games}{', автозапуск' if a.autogame else ''}",
+            f"Время: {elapsed:.2f} с",
+            f"Игр сыграно: {games} (отменено: {self.games_cancelled})",
+            f"Игр в секунду: {games / elapsed:.3f}" if elapsed else "Игр в секунду: -",
+            f"Задержка апдейтов: p50={percentile(self.latencies, 50) * 1000:.1f} мс, "
+            f"p99={percentile(self.latencies, 99) * 1000:.1f} мс (n={len(self.latencies)})",
+            f"Вызовов Bot API: {api_calls}, на игру: {api_calls / games:.1f}" if games
+            else f"Вызовов Bot API: {api_calls}",
+            "По методам: " + ", ".join(
+                f"{k}={v}" for k, v in self.api.calls.most_common() if k not in SERVICE_METHODS
+            ),
+        ]
+        return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Нагрузочный тест бота против фейкового Bot API")
+    p.add_argument("--groups", type=int, default=10, help="число групп")
+    p.add_argument("--players", type=int, default=4, help="игроков в группе")
+    p.add_argument("--think", type=float, default=0.3, help="среднее время «раздумья» игрока (сек)")
+    p.add_argument("--games", type=int, default=2, help="игр на группу")
+    p.add_argument("--afk", type=float, default=0.0, help="доля игроков, не делающих ход (таймауты)")
+    p.add_argument("--stand-on", type=int, default=17, help="игрок останавливается на стольких очках")
+    p.add_argument("--join-timeout", type=int, default=3, help="время регистрации (сек)")
+    p.add_argument("--warn-timeout", type=int, default=2, help="предупреждение игроку (сек)")
+    p.add_argument("--expire-timeout", type=int, default=4, help="таймаут хода (сек)")
+    p.add_argument("--autogame", action="store_true", help="запускать игры автозапуском вместо /newgame")
+    p.add_argument("--seed", type=int, default=None, help="seed для random")
+    p.add_argument("--images", action="store_true", help="рисовать картинку стола (нужен Pillow)")
+    p.add_argument("--live", action="store_true", help="живой стол в группе (правки сообщения)")
+    p.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    # Всё состояние — во временной папке, настоящий storage.json не трогаем
+    workdir = tempfile.mkdtemp(prefix="bj_loadtest_")
+    import settings
+    settings.STATS_FILE = os.path.join(workdir, "storage.json")
+    settings.HISTORY_DIR = os.path.join(workdir, "history")
+    settings.JOIN_TIMEOUT = args.join_timeout
+    settings.TABLE_IMAGE_ENABLED = args.images
+    settings.LIVE_TABLE_ENABLED = args.live
+    settings.PLAYER_WARN_TIMEOUT = args.warn_timeout
+    settings.PLAYER_EXPIRE_TIMEOUT = args.expire_timeout
+    settings.AUTO_GAME_RESTART_DELAY = 0
+    settings.METRICS_ENABLED = False
+    settings.BACKUP_ENABLED = False
+    os.environ["TELEGRAM_ADMIN_ID"] = str(ADMIN_ID)
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    sim = Simulation(args)
+    elapsed = asyncio.run(sim.run())
+    print(sim.report(elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# logsetup.py
+"""Неблокирующее логирование: очередь + поток-слушатель, JSON, ротация по размеру."""
+
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+import settings
+
+# Поля контекста, которые попадают в JSON, если переданы через extra=
+CONTEXT_FIELDS = ("group_id", "user_id", "game_id", "action")
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись. Сообщение форматируется здесь, в потоке-слушателе."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке.
+
+    Стандартный prepare() склеивает msg % args прямо в обработчике апдейта;
+    мы передаём запись как есть — слушатель в том же процессе отформатирует её сам.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю записей с extra={'sample': '<вид>'} согласно LOG_SAMPLE_RATES."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        kind = getattr(record, "sample", None)
+        if kind is None or record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(kind, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+def setup_logging(log_dir: str = settings.LOG_DIR, level=logging.INFO):
+    """Повесить на root очередь; запись в файл/консоль — в отдельном потоке."""
+    os.makedirs(log_dir, exist_ok=True)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, settings.LOG_FILE),
+        maxBytes=settings.LOG_MAX_BYTES,
+        backupCount=settings.LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(JsonFormatter())
+    handlers = [file_handler]
+
+    # В консоль — только при интерактивном запуске (под nohup stdout уходит в файл)
+    if settings.LOG_CONSOLE or sys.stderr.isatty():
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        handlers.append(console)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATES))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+    # httpx пишет INFO на каждый запрос к Bot API
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -10,21 +10,29 @@ from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
     CallbackQueryHandler,
+    ChatMemberHandler,
     ContextTypes,
 )
 from telegram.error import Forbidden
 
 import settings
-
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+import metrics
+import logsetup
+import tenant
+from tenant import TenantApplication, TenantJobQueue, TenantLocal, conf
+from dedup import CallbackDeduper, dedup_callback
+from ratelimit import RateLimiter, ReadCache, Throttle, throttled
+from dispatch import PriorityUpdateProcessor
+
+# Логирование настраивается в main() (logsetup: очередь + JSON-файл с ротацией)
 logger = logging.getLogger(__name__)
 
 def is_admin(user_id: int) -> bool:
     """Проверка является ли пользователь администратором (поддержка списка через запятую)"""
+    # В мультибот-режиме у каждого бота свой список админов
+    t = tenant.current()
+    if t is not None and t.admin_ids is not None:
+        return user_id in t.admin_ids
     admin_ids = os.getenv('TELEGRAM_ADMIN_ID', '')
     if not admin_ids:
         return False
@@ -37,24 +45,56 @@ def admin_only(func):
         user_id = update.effective_user.id
         
         if not is_admin(user_id):
-            logger.warning(f"Non-admin user {user_id} tried to use /{func.__name__.replace('cmd_', '')} command")
+            logger.warning("Non-admin user %s tried to use /%s command", user_id,
+                           func.__name__.replace('cmd_', ''), extra={"user_id": user_id})
             return await update.message.reply_text("❌ У вас нет прав для использования этого бота.")
         
-        logger.info(f"Admin {user_id} used /{func.__name__.replace('cmd_', '')} command")
+        logger.info("Admin %s used /%s command", user_id, func.__name__.replace('cmd_', ''),
+                    extra={"user_id": user_id})
         return await func(update, context)
     
     return wrapper
 from storage import storage
+from history import history
+from backup import BackupStore
 from economy import give_daily
+import bulk
 from game import Game, fmt_hand, hand_value
 from functools import partial
 import asyncio
+import csv
+import io
+import tempfile
+import time
+import profiler
+import render
+from livetable import LiveTables
+from statsapi import DEFAULT_BOT, stats_api
 
 load_dotenv()
 
-JOIN_TIMEOUT = settings.JOIN_TIMEOUT  # 60 секунд
-PLAYER_WARN_TIMEOUT = settings.PLAYER_WARN_TIMEOUT
-PLAYER_EXPIRE_TIMEOUT = settings.PLAYER_EXPIRE_TIMEOUT
+# Отсев двойных нажатий и повторных доставок callback-запросов
+callback_dedup = TenantLocal("callback_dedup", lambda: CallbackDeduper(
+    query_ttl=conf.CALLBACK_DEDUP_QUERY_TTL,
+    action_ttl=conf.CALLBACK_DEDUP_ACTION_TTL,
+))
+
+# Лимиты на спам командами и сброс некритичных команд под нагрузкой
+throttle = TenantLocal("throttle", lambda: Throttle(
+    RateLimiter(conf.RATE_USER_PER_MIN, conf.RATE_USER_BURST),
+    RateLimiter(conf.RATE_CHAT_PER_MIN, conf.RATE_CHAT_BURST),
+    max_in_flight=conf.SHED_API_IN_FLIGHT,
+    max_backlog=conf.SHED_UPDATE_BACKLOG,
+))
+# Картинки стола в конце игры (если установлен Pillow); пул потоков общий для всех ботов
+table_images = render.TableImages(settings.TABLE_RENDER_WORKERS) if render.available() else None
+
+# Живой стол в группе: правки сообщения сливаются, не чаще раза в интервал
+live_tables = TenantLocal("live_tables", lambda: LiveTables(conf.LIVE_TABLE_EDIT_INTERVAL,
+                                                            conf.LIVE_TABLE_MAX_PLAYERS))
+
+# Кэш для /top, /stats, /globaltop: спам в чате не пересчитывает рейтинг каждый раз
+read_cache = TenantLocal("read_cache", lambda: ReadCache(conf.READ_CACHE_TTL))
 
 def make_private_kb(group_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
@@ -66,6 +106,7 @@ def make_private_kb(group_id: int) -> InlineKeyboardMarkup:
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Привет! Присоединяйтесь к игре в 21 в групповом чате.")
 
+@throttled(throttle)
 async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать справку по командам"""
     help_text = """🃏 <b>Blackjack Bot - Справка по командам</b>
@@ -77,10 +118,16 @@ Join - присоединиться к игре
 /daily - получить ежедневный бонус
 /balance - мой баланс и статистика
 /top - топ-5 игроков
+/top today | week - топ за сегодня / неделю
+/globaltop [money|wins|games] - топ по всем чатам
 /stats - сколько игр сыграно в чате
 
 <b>⚙️ Админ:</b>
 /setup - настройки (ставка, автозапуск, ожидание)
+/profile [сек] [mem] - профиль бота в личку
+/airdrop &lt;сумма&gt; - начислить всем игрокам чата
+/importcsv - reply на CSV (chat,user,delta)
+/exportcsv [all] - балансы файлом в личку
 
 <b>ℹ️ Как играть:</b>
 1. Дождитесь создания игры администратором
@@ -106,8 +153,8 @@ async def cmd_newgame(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.chat_data.get('game'):
         return await update.message.reply_text("⚠️ Игра уже запущена! Дождитесь окончания текущей игры.")
     
-    price = get_group_setting(group_id, 'auto_game_price', settings.DEFAULT_PRICE)
-    join_timeout = get_group_setting(group_id, 'join_timeout', settings.JOIN_TIMEOUT)
+    price = get_group_setting(group_id, 'auto_game_price', conf.DEFAULT_PRICE)
+    join_timeout = get_group_setting(group_id, 'join_timeout', conf.JOIN_TIMEOUT)
 
     game = Game()
     context.chat_data['game'] = game
@@ -125,19 +172,18 @@ async def cmd_newgame(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.job_queue.run_once(
         close_registration,
         when=join_timeout,
-        chat_id=group_id
+        chat_id=group_id,
+        name=_registration_name(group_id)
     )
 
 def get_group_setting(group_id, key, default):
     """Получить настройку группы из storage."""
-    group_data = storage._data.get(str(group_id), {})
-    return group_data.get(key, default)
+    return storage.get_setting(group_id, key, default)
 
 
 def set_group_setting(group_id, key, value):
     """Сохранить настройку группы в storage."""
-    group_data = storage._data.setdefault(str(group_id), {})
-    group_data[key] = value
+    storage.set_setting(group_id, key, value)
     storage.save()
 
 
@@ -150,6 +196,20 @@ def get_autogame_job(job_queue, chat_id):
     return jobs[0] if jobs else None
 
 
+def _registration_name(chat_id):
+    return f"close_registration_{chat_id}"
+
+
+def cancel_game_jobs(job_queue, chat_id, game):
+    """Снять таймер регистрации и таймеры ходов игры в чате."""
+    names = [_registration_name(chat_id)]
+    for uid in game.players:
+        names += [f"player_warning_{uid}", f"player_timeout_{uid}"]
+    for name in names:
+        for job in job_queue.get_jobs_by_name(name):
+            job.schedule_removal()
+
+
 def cancel_autogame_job(job_queue, chat_id):
     for job in job_queue.get_jobs_by_name(_autogame_name(chat_id)):
         job.schedule_removal()
@@ -173,7 +233,7 @@ def fmt_interval(seconds):
 
 def make_setup_text(group_id, context=None):
     """Текст настроек с инфо о следующем автозапуске."""
-    autogame = get_group_setting(group_id, 'auto_game_enabled', settings.AUTO_GAME_ENABLED)
+    autogame = get_group_setting(group_id, 'auto_game_enabled', conf.AUTO_GAME_ENABLED)
     text = "⚙️ Настройки"
     if autogame and context:
         job = get_autogame_job(context.job_queue, group_id)
@@ -193,10 +253,10 @@ def make_setup_text(group_id, context=None):
 
 def make_setup_kb(group_id):
     """Создать клавиатуру настроек."""
-    autogame = get_group_setting(group_id, 'auto_game_enabled', settings.AUTO_GAME_ENABLED)
-    price = get_group_setting(group_id, 'auto_game_price', settings.AUTO_GAME_PRICE)
-    timeout = get_group_setting(group_id, 'join_timeout', settings.JOIN_TIMEOUT)
-    interval = get_group_setting(group_id, 'auto_game_interval', settings.AUTO_GAME_INTERVAL)
+    autogame = get_group_setting(group_id, 'auto_game_enabled', conf.AUTO_GAME_ENABLED)
+    price = get_group_setting(group_id, 'auto_game_price', conf.AUTO_GAME_PRICE)
+    timeout = get_group_setting(group_id, 'join_timeout', conf.JOIN_TIMEOUT)
+    interval = get_group_setting(group_id, 'auto_game_interval', conf.AUTO_GAME_INTERVAL)
     autogame_label = "🎰 Автозапуск: ВКЛ" if autogame else "🎰 Автозапуск: ВЫКЛ"
     return InlineKeyboardMarkup([
         [InlineKeyboardButton(autogame_label, callback_data="setup_autogame")],
@@ -221,13 +281,13 @@ async def cb_setup_autogame(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     group_id = update.effective_chat.id
 
-    enabled = get_group_setting(group_id, 'auto_game_enabled', settings.AUTO_GAME_ENABLED)
+    enabled = get_group_setting(group_id, 'auto_game_enabled', conf.AUTO_GAME_ENABLED)
     if enabled:
         set_group_setting(group_id, 'auto_game_enabled', False)
         cancel_autogame_job(context.job_queue, group_id)
     else:
         set_group_setting(group_id, 'auto_game_enabled', True)
-        interval = get_group_setting(group_id, 'auto_game_interval', settings.AUTO_GAME_INTERVAL)
+        interval = get_group_setting(group_id, 'auto_game_interval', conf.AUTO_GAME_INTERVAL)
         if not get_autogame_job(context.job_queue, group_id):
             schedule_autogame(context.job_queue, group_id, when=interval)
 
@@ -334,35 +394,41 @@ async def cb_setup_back(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.edit_message_text(make_setup_text(group_id, context), reply_markup=make_setup_kb(group_id))
 
 
+@dedup_callback(callback_dedup, remember=False)
+@metrics.timed("cb_join")
 async def cb_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query   = update.callback_query
     user    = query.from_user
     group_id= update.effective_chat.id
     game    = context.chat_data.get('game')
     price   = context.chat_data.get('price', 0)
-    udata   = storage.get_user(group_id, user.id, user.first_name)
-    
-    logger.info(f"User {user.id} ({user.first_name}) joined game in group {group_id}, price: {price}")
 
-    # 1) Проверяем ставку
-    if udata['money'] < price:
-        return await query.answer(
-            f"У вас недостаточно фишек (ставка {price}, у вас {udata['money']})",
-            show_alert=True
-        )
+    logger.info("User %s (%s) joined game in group %s, price: %s", user.id, user.first_name, group_id, price,
+                extra={"group_id": group_id, "user_id": user.id, "game_id": game.id if game else None})
 
-    # 2) Проверяем состояние игры
+    # 1) Проверяем состояние игры
     if not game or game.started:
         return await query.answer("Игра не создана или уже идёт.", show_alert=True)
 
-    # 3) Списываем ставку сразу
-    storage.add_money(group_id, user.id, -price)
-    storage.save()
+    # 2) Проверяем ставку — без создания записи: отказ не должен заводить игрока
+    udata = storage.find_user(group_id, user.id)
+    money = udata['money'] if udata else 0
+    if money < price:
+        return await query.answer(
+            f"У вас недостаточно фишек (ставка {price}, у вас {money})",
+            show_alert=True
+        )
 
-    # 4) Добавляем в игру
+    # 3) Добавляем в игру — до списания: повторный Join (в том числе параллельный)
+    #    не должен списать ставку второй раз
     ok = game.add_player(user.id, user.first_name)
     if not ok:
         return await query.answer("Вы уже в игре.", show_alert=True)
+    storage.get_user(group_id, user.id, user.first_name)
+
+    # 4) Списываем ставку сразу
+    storage.add_money(group_id, user.id, -price)
+    storage.save()
 
     # 5) Уведомляем игрока в личке
     try:
@@ -407,6 +473,7 @@ async def cb_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Таймеры хода будут запущены после раздачи карт в close_registration
 
 
+@metrics.timed("close_registration")
 async def close_registration(context: ContextTypes.DEFAULT_TYPE):
     job = context.job
     group_id = job.chat_id
@@ -437,7 +504,7 @@ async def close_registration(context: ContextTypes.DEFAULT_TYPE):
         )
         # Автозапуск: никто не пришёл → следующая попытка через интервал
         if get_group_setting(group_id, 'auto_game_enabled', False):
-            interval = get_group_setting(group_id, 'auto_game_interval', settings.AUTO_GAME_INTERVAL)
+            interval = get_group_setting(group_id, 'auto_game_interval', conf.AUTO_GAME_INTERVAL)
             schedule_autogame(context.job_queue, group_id, when=interval)
         return
 
@@ -469,7 +536,7 @@ async def close_registration(context: ContextTypes.DEFAULT_TYPE):
         # предупреждение через 30 секунд
         context.job_queue.run_once(
             player_warning,
-            when=PLAYER_WARN_TIMEOUT,
+            when=conf.PLAYER_WARN_TIMEOUT,
             chat_id=uid,
             data={'group_id': group_id},
             name=f"player_warning_{uid}"
@@ -477,13 +544,17 @@ async def close_registration(context: ContextTypes.DEFAULT_TYPE):
         # окончательный таймаут через 45 секунд (30+15)
         context.job_queue.run_once(
             partial(player_timeout, group_id=group_id),
-            when=PLAYER_EXPIRE_TIMEOUT,
+            when=conf.PLAYER_EXPIRE_TIMEOUT,
             chat_id=uid,
             name=f"player_timeout_{uid}"
         )
 
-    first = game.dealer[0]
-    await context.bot.send_message(group_id, f"Первая карта дилера: {first.rank}{first.suit}")
+    if conf.LIVE_TABLE_ENABLED:
+        # Открытая карта дилера — в сообщении стола
+        await live_tables.open(context, group_id, game)
+    else:
+        first = game.dealer[0]
+        await context.bot.send_message(group_id, f"Первая карта дилера: {first.rank}{first.suit}")
 
 async def player_warning(context: ContextTypes.DEFAULT_TYPE):
     uid = context.job.chat_id
@@ -493,10 +564,12 @@ async def player_warning(context: ContextTypes.DEFAULT_TYPE):
     if group_id:
         game = context.application.chat_data.get(group_id, {}).get('game')
         if not game or not game.started or uid not in game.players:
-            logger.info(f"Game ended, skipping warning for user {uid}")
+            logger.info("Game ended, skipping warning for user %s", uid,
+                        extra={"group_id": group_id, "user_id": uid, "sample": "action"})
             return
         if game.players[uid]['stand']:
-            logger.info(f"Player {uid} already stood, skipping warning")
+            logger.info("Player %s already stood, skipping warning", uid,
+                        extra={"group_id": group_id, "user_id": uid, "game_id": game.id, "sample": "action"})
             return
     
     try:
@@ -504,9 +577,9 @@ async def player_warning(context: ContextTypes.DEFAULT_TYPE):
             uid,
             "⚠ Вы не сделали ход за 30 секунд. Не забудьте нажать кнопку!"
         )
-        logger.info(f"Sent warning to user {uid}")
+        logger.info("Sent warning to user %s", uid, extra={"group_id": group_id, "user_id": uid})
     except Forbidden:
-        logger.warning(f"Cannot send warning to user {uid} - forbidden")
+        logger.warning("Cannot send warning to user %s - forbidden", uid, extra={"user_id": uid})
         pass
 
 async def player_timeout(context: ContextTypes.DEFAULT_TYPE, group_id: int):
@@ -518,40 +591,52 @@ async def player_timeout(context: ContextTypes.DEFAULT_TYPE, group_id: int):
     # помечаем как «выбыл»
     game.players[uid]['bust'] = True
     game.players[uid]['stand'] = True
+    game.players[uid]['timed_out'] = True
+    live_tables.update(context, group_id)
 
     try:
         await context.bot.send_message(uid, "⏰ Время вышло — вы выбываете.")
     except Forbidden:
         pass
 
-    # информируем группу
-    name = game.players[uid]['name']
-    await context.bot.send_message(
-        group_id,
-        f"⚠ Игрок {name} не успел сделать ход и выбывает."
-    )
+    # информируем группу (если стол опубликован — статусом в нём, без отдельного сообщения)
+    if not live_tables.has(context, group_id):
+        name = game.players[uid]['name']
+        await context.bot.send_message(
+            group_id,
+            f"⚠ Игрок {name} не успел сделать ход и выбывает."
+        )
 
     # если все ещё окончено, подводим итоги
     if game.all_done():
         game.dealer_play()
         await finish_game_group(context, group_id)
 
+@metrics.timed("finish_game_group")
 async def finish_game_group(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
     # достаём и удаляем игру
     game: Game = context.application.chat_data[chat_id].pop('game', None)
     if not game:
         return
 
+    live_tables.close(context, chat_id)
+
     # Отменяем таймеры ходов для всех игроков
-    for uid in game.players:
-        for name in (f"player_warning_{uid}", f"player_timeout_{uid}"):
-            for job in context.job_queue.get_jobs_by_name(name):
-                job.schedule_removal()
+    cancel_game_jobs(context.job_queue, chat_id, game)
 
     # Итог для чата
     price = context.application.chat_data[chat_id].get('price', 0)
     result = game.results(chat_id, price=price)
+    history.record(chat_id, game, price)
+    read_cache.invalidate(chat_id)
+    logger.info("Game %s finished in group %s: %s players, bank %s", game.id, chat_id, len(game.players), game.bank,
+                extra={"group_id": chat_id, "game_id": game.id})
     await context.bot.send_message(chat_id, "🃏 Игра окончена!\n" + result)
+    if table_images and conf.TABLE_IMAGE_ENABLED:
+        # Рисуется в фоне: балансы и автозапуск не ждут картинку
+        context.application.create_task(
+            table_images.send(context.bot, chat_id, game, conf.TABLE_IMAGE_MAX_PLAYERS)
+        )
 
     # Личный баланс каждому игроку
     for uid in game.players:
@@ -562,10 +647,12 @@ async def finish_game_group(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
         except Forbidden:
             pass
 
-    # Автозапуск: игра сыграна → новая через 10 секунд
+    # Автозапуск: игра сыграна → новая через AUTO_GAME_RESTART_DELAY секунд
     if get_group_setting(chat_id, 'auto_game_enabled', False):
-        schedule_autogame(context.job_queue, chat_id, when=10)
+        schedule_autogame(context.job_queue, chat_id, when=conf.AUTO_GAME_RESTART_DELAY)
 
+@dedup_callback(callback_dedup)
+@metrics.timed("cb_action")
 async def cb_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -575,11 +662,13 @@ async def cb_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     group_id = int(group_id)
     uid = query.from_user.id
     
-    logger.info(f"User {uid} performed action '{action}' in group {group_id}")
-
     # достаём данные конкретной игры из chat_data группового чата
     game = context.application.chat_data.get(group_id, {}).get('game')
 
+    logger.info("User %s performed action '%s' in group %s", uid, action, group_id,
+                extra={"group_id": group_id, "user_id": uid, "game_id": game.id if game else None,
+                       "action": action, "sample": "action"})
+
     # Если нет игры или пользователь не в списке — скрываем кнопки и выходим
     if not game or not game.started or uid not in game.players:
         await context.bot.edit_message_reply_markup(
@@ -635,6 +724,8 @@ async def cb_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text="✋ Вы остановились."
         )
 
+    live_tables.update(context, group_id)
+
     # Если после хода все закончили — подводим итоги в группе
     if game.all_done():
         game.dealer_play()
@@ -658,21 +749,107 @@ async def cmd_addmoney(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(f"💵 {target.first_name}: {'+' if amount >= 0 else ''}{amount} фишек. Баланс: {user['money']}💳")
 
 
+def _progress_editor(status_msg, label: str, unit: str = "строк"):
+    """Колбэк прогресса для bulk-операций: правит статусное сообщение."""
+    async def on_progress(done: int):
+        try:
+            await status_msg.edit_text(f"{label}: обработано {done} {unit}…")
+        except Exception:
+            pass
+    return on_progress
+
+
+@admin_only
+async def cmd_airdrop(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Начислить фишки всем игрокам чата: /airdrop <сумма>"""
+    if update.effective_chat.type == 'private':
+        return await update.message.reply_text("Эта команда работает только в группе.")
+    if not context.args or not context.args[0].lstrip('-').isdigit():
+        return await update.message.reply_text("Использование: /airdrop <сумма>")
+    amount = int(context.args[0])
+    status = await update.message.reply_text("🪂 Airdrop…")
+    count, archived = await bulk.airdrop(
+        update.effective_chat.id,
+        amount,
+        on_progress=_progress_editor(status, "🪂 Airdrop", "игроков")
+    )
+    text = f"🪂 Airdrop: {'+' if amount >= 0 else ''}{amount} фишек для {count} игроков."
+    if archived:
+        text += f"\nНеактивным игрокам из архива ({archived}) не начислено."
+    await status.edit_text(text)
+
+
+@admin_only
+async def cmd_importcsv(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Импорт CSV (chat,user,delta): reply на сообщение с файлом + /importcsv"""
+    reply = update.message.reply_to_message
+    if not reply or not reply.document:
+        return await update.message.reply_text(
+            "Ответьте на сообщение с CSV-файлом: /importcsv\n"
+            "Формат строк: chat,user,delta (пустой chat — текущий чат)"
+        )
+    status = await update.message.reply_text("📥 Импорт: загружаю файл…")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "import.csv")
+        try:
+            tg_file = await reply.document.get_file()
+            await tg_file.download_to_drive(path)
+        except Exception:
+            logger.exception("CSV import: download failed", extra={"group_id": update.effective_chat.id})
+            return await status.edit_text("❌ Импорт: не удалось загрузить файл.")
+        try:
+            applied, skipped = await bulk.import_csv(
+                path,
+                default_chat=update.effective_chat.id,
+                on_progress=_progress_editor(status, "📥 Импорт")
+            )
+        except (UnicodeDecodeError, csv.Error) as e:
+            # Ошибка чтения — до применения: storage не изменён
+            return await status.edit_text(f"❌ Импорт: файл не разобран ({e.__class__.__name__}), ничего не применено.")
+    await status.edit_text(f"✅ Импорт завершён: применено {applied}, пропущено {skipped} строк.")
+
+
+@admin_only
+async def cmd_exportcsv(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выгрузить балансы в CSV в личку: /exportcsv (этот чат) или /exportcsv all"""
+    export_all = update.effective_chat.type == 'private' or (context.args and context.args[0] == 'all')
+    chat_id = None if export_all else update.effective_chat.id
+    status = await update.message.reply_text("📤 Экспорт…")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "balances.csv")
+        rows = await bulk.export_csv(path, chat_id, on_progress=_progress_editor(status, "📤 Экспорт"))
+        filename = f"balances_{'all' if export_all else chat_id}_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+        try:
+            with open(path, 'rb') as f:
+                await context.bot.send_document(
+                    update.effective_user.id,
+                    document=f,
+                    filename=filename,
+                    caption=f"📤 Балансы: {rows} строк"
+                )
+        except Forbidden:
+            return await status.edit_text("Напишите боту в ЛС, чтобы получить файл.")
+    await status.edit_text(f"✅ Экспорт: {rows} строк отправлено в личку.")
+
+
+@throttled(throttle, shed=False)
 async def cmd_daily(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     name = update.effective_user.first_name
     group_id = update.effective_chat.id
-    ok, rem = give_daily(group_id, uid)
+    ok, rem = give_daily(group_id, uid, name)
     if ok:
-        await update.message.reply_text(f"👤 {name}\n💰 +{settings.DAILY_BONUS} фишек!")
+        await update.message.reply_text(f"👤 {name}\n💰 +{conf.DAILY_BONUS} фишек!")
     else:
         await update.message.reply_text(f"👤 {name}\nБонус уже получен. Попробуйте через {rem} ч.")
 
+@throttled(throttle)
 async def cmd_balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     name = update.effective_user.first_name
     group_id = update.effective_chat.id
-    u = storage.get_user(group_id, uid, name)
+    # Только чтение: /balance не заводит пустую запись тому, кто ни разу не играл
+    u = storage.find_user(group_id, uid) or {"money": 0, "wins": 0, "games": 0}
     try:
         await context.bot.send_message(
             uid,
@@ -684,10 +861,22 @@ async def cmd_balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+PERIOD_ARGS = {
+    "today": ("day", "сегодня"),
+    "day": ("day", "сегодня"),
+    "сегодня": ("day", "сегодня"),
+    "week": ("week", "за неделю"),
+    "неделя": ("week", "за неделю"),
+}
+
+
+@throttled(throttle)
 async def cmd_top(update: Update, context: ContextTypes.DEFAULT_TYPE):
     name = update.effective_user.first_name
     group_id = update.effective_chat.id
-    top = storage.leaderboard(group_id, key="games", limit=5)
+    if context.args and context.args[0].lower() in PERIOD_ARGS:
+        return await top_period(update, *PERIOD_ARGS[context.args[0].lower()])
+    top = read_cache.get(group_id, "top", lambda: storage.leaderboard(group_id, key="games", limit=5))
     if not top:
         return await update.message.reply_text(f"👤 {name}\nПока нет игроков в рейтинге.")
     lines = [f"🏆 Топ-5 ({name}):"]
@@ -696,17 +885,130 @@ async def cmd_top(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("\n".join(lines))
 
 
-async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+def make_period_top_text(group_id: int, period: str, title: str) -> str:
+    top = history.period_leaderboard(group_id, period, key="net", limit=5)
+    if not top:
+        return f"🏆 Топ {title}: пока никто не играл."
+    lines = [f"🏆 Топ-5 {title}:"]
+    for i, (uid, st) in enumerate(top, 1):
+        sign = "+" if st['net'] > 0 else ""
+        lines.append(f"{i}. {storage.name(uid)} — {sign}{st['net']}💳, {st['games']} игр, {st['wins']} побед")
+    return "\n".join(lines)
+
+
+async def top_period(update: Update, period: str, title: str):
+    """Топ за период по чистому выигрышу — из готовых сводок истории."""
     group_id = update.effective_chat.id
+    text = read_cache.get(group_id, f"top:{period}", lambda: make_period_top_text(group_id, period, title))
+    await update.message.reply_text(text)
+
+
+GLOBAL_KEYS = {
+    "money": "💳",
+    "wins": "побед",
+    "games": "игр",
+}
+
+
+@throttled(throttle)
+async def cmd_globaltop(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Глобальный топ по всем чатам: /globaltop [money|wins|games]"""
+    key = context.args[0].lower() if context.args else "money"
+    if key not in GLOBAL_KEYS:
+        return await update.message.reply_text("Использование: /globaltop [money|wins|games]")
+    unit = GLOBAL_KEYS[key]
+    top = read_cache.get(None, f"globaltop:{key}", lambda: storage.global_top(key, limit=10))
+    if not top:
+        return await update.message.reply_text("🌍 Пока нет игроков в глобальном рейтинге.")
+    lines = [f"🌍 Глобальный топ-10 ({key}):"]
+    for i, u in enumerate(top, 1):
+        lines.append(f"{i}. {u['name']} — {u[key]} {unit}")
+    me = storage.global_rank(update.effective_user.id, key)
+    if me:
+        place, value, total = me
+        lines.append(f"\nВы: {place} место из {total} ({value} {unit})")
+    await update.message.reply_text("\n".join(lines))
+
+
+def make_stats_text(group_id: int) -> str:
     c = storage.chat_stats(group_id)
-    await update.message.reply_text(f"📊 Всего игр сыграно в чате: {c['games_played']}")
+    today = history.period_stats(group_id, "day")
+    week = history.period_stats(group_id, "week")
+    return (
+        f"📊 Всего игр сыграно в чате: {c['games_played']}\n"
+        f"Сегодня: {today['games']}, за неделю: {week['games']}"
+    )
+
+
+@throttled(throttle)
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    group_id = update.effective_chat.id
+    await update.message.reply_text(read_cache.get(group_id, "stats", lambda: make_stats_text(group_id)))
 
 
 @admin_only
 async def cmd_stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Остановить бота (только для админа)"""
     await update.message.reply_text("🛑 Останавливаю бота...")
-    context.application.stop_running()
+    t = tenant.current()
+    if t is not None and t.stop_event is not None:
+        # Мультибот: останавливаем только этого бота, остальные продолжают работу
+        t.stop_event.set()
+    else:
+        context.application.stop_running()
+
+@admin_only
+async def cmd_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Профилировать бота: /profile [секунды] [mem] — отчёт придёт файлом в личку"""
+    seconds = conf.PROFILE_DEFAULT_SECONDS
+    with_memory = False
+    for arg in context.args or []:
+        if arg.isdigit():
+            seconds = int(arg)
+        elif arg.lower() in ("mem", "memory"):
+            with_memory = True
+    seconds = max(1, min(seconds, conf.PROFILE_MAX_SECONDS))
+
+    # Занимаем сразу, до первого await: второй быстрый /profile получит отказ здесь
+    if not profiler.reserve():
+        return await update.message.reply_text("⏳ Профилирование уже идёт, дождитесь отчёта.")
+
+    admin_id = update.effective_user.id
+    try:
+        await update.message.reply_text(
+            f"🔬 Профилирую {seconds} сек{' + память' if with_memory else ''}. Отчёт придёт в личку."
+        )
+        # Не блокируем обработку апдейтов — профиль снимается в фоне
+        context.application.create_task(
+            _run_profile(context.application, admin_id, seconds, with_memory),
+            name=f"profile_{admin_id}"
+        )
+    except BaseException:
+        profiler.release()
+        raise
+
+
+async def _run_profile(app, admin_id: int, seconds: int, with_memory: bool):
+    try:
+        report = await profiler.capture(app, seconds, with_memory=with_memory, reserved=True)
+    except Exception as e:
+        logger.exception("Profiling failed")
+        try:
+            await app.bot.send_message(admin_id, f"❌ Профилирование не удалось: {e}")
+        except Forbidden:
+            pass
+        return
+    filename = f"profile_{time.strftime('%Y%m%d_%H%M%S')}.txt"
+    try:
+        await app.bot.send_document(
+            admin_id,
+            document=io.BytesIO(report.encode("utf-8")),
+            filename=filename,
+            caption=f"🔬 Профиль за {seconds} сек"
+        )
+    except Forbidden:
+        logger.warning("Cannot send profile to admin %s - forbidden", admin_id, extra={"user_id": admin_id})
+
 
 async def auto_start_game(context: ContextTypes.DEFAULT_TYPE):
     """Автоматический запуск игры"""
@@ -717,7 +1019,7 @@ async def auto_start_game(context: ContextTypes.DEFAULT_TYPE):
     group_data = storage._data.get(str(group_id), {})
     
     # Проверяем включен ли автозапуск
-    if not group_data.get('auto_game_enabled', settings.AUTO_GAME_ENABLED):
+    if not group_data.get('auto_game_enabled', conf.AUTO_GAME_ENABLED):
         return
     
     # Проверяем что нет активной игры
@@ -726,8 +1028,8 @@ async def auto_start_game(context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Получаем настройки
-    price = group_data.get('auto_game_price', settings.AUTO_GAME_PRICE)
-    min_players = settings.AUTO_GAME_MIN_PLAYERS
+    price = group_data.get('auto_game_price', conf.AUTO_GAME_PRICE)
+    min_players = conf.AUTO_GAME_MIN_PLAYERS
     
     # Проверяем есть ли достаточно игроков с деньгами
     users_with_money = 0
@@ -743,7 +1045,7 @@ async def auto_start_game(context: ContextTypes.DEFAULT_TYPE):
             f"🎰 Автозапуск: недостаточно игроков с балансом {price}💳 (нужно минимум {min_players})"
         )
         # Повторить через интервал
-        interval = get_group_setting(group_id, 'auto_game_interval', settings.AUTO_GAME_INTERVAL)
+        interval = get_group_setting(group_id, 'auto_game_interval', conf.AUTO_GAME_INTERVAL)
         schedule_autogame(context.job_queue, group_id, when=interval)
         return
     
@@ -754,7 +1056,7 @@ async def auto_start_game(context: ContextTypes.DEFAULT_TYPE):
     chat_data['join_count'] = 0
     chat_data['price'] = price
     
-    join_timeout = get_group_setting(group_id, 'join_timeout', settings.JOIN_TIMEOUT)
+    join_timeout = get_group_setting(group_id, 'join_timeout', conf.JOIN_TIMEOUT)
 
     kb = InlineKeyboardMarkup([[InlineKeyboardButton(f"Join (0)", callback_data="join")]])
     msg = await context.bot.send_message(
@@ -769,34 +1071,138 @@ async def auto_start_game(context: ContextTypes.DEFAULT_TYPE):
     context.job_queue.run_once(
         close_registration,
         when=join_timeout,
-        chat_id=group_id
+        chat_id=group_id,
+        name=_registration_name(group_id)
     )
 
 
 
 async def restore_autogames(app):
     """Восстановить автозапуск игр из storage после рестарта бота."""
-    for chat_id_str, group_data in storage._data.items():
-        if not isinstance(group_data, dict):
-            continue
+    for chat_id_str, group_data in storage.chats():
         if not group_data.get('auto_game_enabled', False):
             continue
         chat_id = int(chat_id_str)
-        interval = group_data.get('auto_game_interval', settings.AUTO_GAME_INTERVAL)
+        interval = group_data.get('auto_game_interval', conf.AUTO_GAME_INTERVAL)
         app.job_queue.run_once(
             auto_start_game,
             when=interval,
             chat_id=chat_id,
             name=_autogame_name(chat_id)
         )
-        logger.info(f"Restored autogame for chat {chat_id}, interval={interval}s")
+        logger.info("Restored autogame for chat %s, interval=%ss", chat_id, interval, extra={"group_id": chat_id})
 
 
-def main():
-    token = os.getenv("TG_BOT_TOKEN")
-    if not token:
-        raise RuntimeError("Установите TG_BOT_TOKEN")
-    app = ApplicationBuilder().post_init(restore_autogames).token(token).build()
+backups = TenantLocal("backups", BackupStore)
+
+
+async def backup_job(context: ContextTypes.DEFAULT_TYPE):
+    """Бэкап storage без остановки обработчиков.
+
+    Изменённые чаты сериализуются в event loop (согласованный снимок),
+    а хэши, сжатие и запись на диск уходят в отдельный поток.
+    """
+    full = await asyncio.to_thread(backups.needs_full)
+    if full:
+        chats_raw, removed = storage.snapshot_chats()
+    else:
+        chats_raw, removed = storage.snapshot_chats(storage.take_dirty())
+    try:
+        entry = await asyncio.to_thread(backups.write, chats_raw, removed, full)
+    except Exception:
+        # Не потерять изменения: вернём чаты в следующий инкремент
+        for cid in list(chats_raw) + list(removed):
+            storage.touch(cid)
+        raise
+    if entry:
+        logger.info("Backup %s: %s chats, %s removed", entry['file'], entry['chats'], entry['removed'])
+
+
+async def on_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Бота удалили из группы — чат уходит в холодный архив до возвращения."""
+    change = update.my_chat_member
+    if change.new_chat_member.status not in ("left", "kicked"):
+        return
+    chat_id = change.chat.id
+    cancel_autogame_job(context.job_queue, chat_id)
+    data = context.application.chat_data.get(chat_id, {})
+    game = data.pop('game', None)
+    if game:
+        # Игра не доиграна: таймеры снимаем, ставки (списаны при Join) возвращаем
+        cancel_game_jobs(context.job_queue, chat_id, game)
+        price = data.get('price', 0)
+        if price > 0:
+            for uid in game.players:
+                storage.add_money(chat_id, uid, price)
+        live_tables.discard(context, chat_id)
+        logger.info("Game %s cancelled: bot left chat %s", game.id, chat_id,
+                    extra={"group_id": chat_id, "game_id": game.id})
+    if storage.archive_chat(chat_id):
+        logger.info("Bot left chat %s, chat archived", chat_id, extra={"group_id": chat_id})
+    storage.save()
+
+
+async def archive_job(context: ContextTypes.DEFAULT_TYPE):
+    """Перенести в архив игроков без активности дольше ARCHIVE_USER_IDLE_DAYS."""
+    keep = {
+        (chat_id, uid)
+        for chat_id, data in context.application.chat_data.items()
+        if data.get('game')
+        for uid in data['game'].players
+    }
+    cutoff = time.time() - conf.ARCHIVE_USER_IDLE_DAYS * 86400
+    moved = 0
+    for chat_id, uids in storage.idle_users(cutoff, keep).items():
+        moved += storage.archive_users(chat_id, uids)
+        # Большой первый проход не должен держать event loop
+        await asyncio.sleep(0)
+    storage.save()
+    if moved:
+        logger.info("Archived %s inactive users", moved)
+
+
+async def history_flush_job(context: ContextTypes.DEFAULT_TYPE):
+    """Записать сводки истории в rollups.json, если с прошлого раза были игры."""
+    history.flush()
+
+
+async def flush_history(app):
+    """При остановке бота: последние сводки — на диск."""
+    history.flush()
+
+
+async def stats_api_job(context: ContextTypes.DEFAULT_TYPE):
+    """Пересобрать снимок для HTTP API статистики (только изменённые чаты)."""
+    t = tenant.current()
+    await stats_api.refresh(t.name if t is not None else DEFAULT_BOT, storage)
+
+
+async def refresh_metrics(context: ContextTypes.DEFAULT_TYPE):
+    """Обновить gauge-метрики (активные игры, игроки, задачи JobQueue)."""
+    metrics.refresh_gauges(context.application)
+
+
+def build_application(token: str, base_url: str | None = None, bot_tenant=None,
+                      request=None, scheduler=None):
+    """Собрать Application со всеми обработчиками.
+
+    base_url — для фейкового Bot API в тестах; bot_tenant, request и scheduler
+    передаёт лаунчер мультибота (multibot.py), чтобы боты делили пул
+    соединений и планировщик.
+    """
+    builder = (
+        ApplicationBuilder()
+        .application_class(TenantApplication, kwargs={"tenant": bot_tenant})
+        .post_init(restore_autogames)
+        .post_stop(flush_history)
+        .token(token)
+        .request(request or metrics.InstrumentedRequest())
+        .job_queue(TenantJobQueue(scheduler))
+        .concurrent_updates(PriorityUpdateProcessor(conf.UPDATE_WORKERS, conf.UPDATE_QUEUE_LIMITS))
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    app = builder.build()
 
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("help", cmd_help))
@@ -809,9 +1215,14 @@ def main():
     app.add_handler(CommandHandler("balance", cmd_balance))
     app.add_handler(CommandHandler("top", cmd_top))
     app.add_handler(CommandHandler("stats", cmd_stats))
+    app.add_handler(CommandHandler("globaltop", cmd_globaltop))
     app.add_handler(CommandHandler("setup", cmd_setup))
     app.add_handler(CommandHandler("addmoney", cmd_addmoney))
+    app.add_handler(CommandHandler("airdrop", cmd_airdrop))
+    app.add_handler(CommandHandler("importcsv", cmd_importcsv))
+    app.add_handler(CommandHandler("exportcsv", cmd_exportcsv))
     app.add_handler(CommandHandler("stop", cmd_stop))
+    app.add_handler(CommandHandler("profile", cmd_profile))
 
     # Setup inline callbacks
     app.add_handler(CallbackQueryHandler(cb_setup_autogame, pattern="^setup_autogame$"))
@@ -822,10 +1233,69 @@ def main():
     app.add_handler(CallbackQueryHandler(cb_setup_interval, pattern="^setup_interval$"))
     app.add_handler(CallbackQueryHandler(cb_setinterval, pattern="^setinterval:"))
     app.add_handler(CallbackQueryHandler(cb_setup_back, pattern="^setup_back$"))
+    app.add_handler(ChatMemberHandler(on_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER))
+
+    if conf.BACKUP_ENABLED:
+        # Пока бот держит папку, backup.py snapshot по storage.json не работает
+        if not backups.hold():
+            logger.warning("Backup directory is held by another running bot")
+        app.job_queue.run_repeating(
+            backup_job,
+            interval=conf.BACKUP_INTERVAL,
+            first=conf.BACKUP_INTERVAL,
+            name="storage_backup"
+        )
+
+    app.job_queue.run_repeating(
+        history_flush_job,
+        interval=conf.HISTORY_FLUSH_INTERVAL,
+        first=conf.HISTORY_FLUSH_INTERVAL,
+        name="history_flush"
+    )
+
+    if conf.ARCHIVE_ENABLED:
+        app.job_queue.run_repeating(
+            archive_job,
+            interval=conf.ARCHIVE_INTERVAL,
+            first=conf.ARCHIVE_INTERVAL,
+            name="storage_archive"
+        )
+
+    if settings.STATS_API_ENABLED:
+        app.job_queue.run_repeating(
+            stats_api_job,
+            interval=settings.STATS_API_REFRESH_INTERVAL,
+            first=0,
+            name="stats_api_refresh"
+        )
+
+    # В мультибот-режиме метрики по всем ботам обновляет лаунчер
+    if settings.METRICS_ENABLED and bot_tenant is None:
+        app.job_queue.run_repeating(
+            refresh_metrics,
+            interval=settings.METRICS_REFRESH_INTERVAL,
+            first=0,
+            name="metrics_refresh"
+        )
+    return app
+
+
+def main():
+    token = os.getenv("TG_BOT_TOKEN")
+    if not token:
+        raise RuntimeError("Установите TG_BOT_TOKEN")
+    logsetup.setup_logging()
+    app = build_application(token)
+
+    if settings.METRICS_ENABLED:
+        metrics.start_http_server(settings.METRICS_HOST, settings.METRICS_PORT)
+    if settings.STATS_API_ENABLED:
+        stats_api.start_http_server(settings.STATS_API_HOST, settings.STATS_API_PORT,
+                                    settings.STATS_API_REFRESH_INTERVAL)
 
     print("Bot up...")
     app.run_polling(drop_pending_updates=True)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
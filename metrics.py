@@ -0,0 +1,276 @@
+# metrics.py
+"""Лёгкие метрики в формате Prometheus без внешних зависимостей."""
+
+import bisect
+import functools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Границы бакетов гистограмм (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{str(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        lines = self._header()
+        for key, v in items:
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_value(v)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def get(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        lines = self._header()
+        for key, v in items:
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_value(v)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help_text, labels)
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # [счётчики по бакетам + Inf, сумма, количество]
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels):
+        """Контекстный менеджер: замер длительности блока."""
+        return _Timer(self, labels)
+
+    def render(self):
+        with self._lock:
+            items = [(k, (list(s[0]), s[1], s[2])) for k, s in self._values.items()]
+        lines = self._header()
+        for key, (counts, total, count) in items:
+            acc = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                lbl = _fmt_labels(self.labels, key, ("le", _fmt_value(bound)))
+                lines.append(f"{self.name}_bucket{lbl} {acc}")
+            lbl = _fmt_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{lbl} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{lbl} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "start")
+
+    def __init__(self, hist, labels):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self) -> bytes:
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+REGISTRY = Registry()
+
+# --- Метрики бота -----------------------------------------------------
+HANDLER_LATENCY = Histogram(
+    "bot_handler_latency_seconds", "Время выполнения обработчиков", ("handler",)
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("handler",)
+)
+API_LATENCY = Histogram(
+    "bot_api_request_latency_seconds", "Длительность запросов к Bot API", ("method",)
+)
+API_ERRORS = Counter(
+    "bot_api_errors_total", "Ошибки запросов к Bot API", ("method",)
+)
+API_RETRY_AFTER = Counter(
+    "bot_api_retry_after_total", "Ответы 429 (RetryAfter) от Bot API", ("method",)
+)
+STORAGE_SAVE_LATENCY = Histogram(
+    "bot_storage_save_seconds", "Длительность Storage.save"
+)
+STORAGE_SAVE_BYTES = Histogram(
+    "bot_storage_save_bytes", "Размер storage.json при сохранении", buckets=BYTES_BUCKETS
+)
+ACTIVE_GAMES = Gauge("bot_active_games", "Активные игры")
+PLAYERS_IN_GAMES = Gauge("bot_players_in_games", "Игроки в активных играх")
+PENDING_JOBS = Gauge("bot_pending_jobs", "Задачи в JobQueue")
+API_IN_FLIGHT = Gauge("bot_api_in_flight", "Запросы к Bot API, ожидающие ответа")
+
+
+def timed(handler_name: str):
+    """Декоратор: гистограмма времени и счётчик ошибок для async-обработчика."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(handler_name)
+                raise
+            finally:
+                HANDLER_LATENCY.observe(time.perf_counter() - start, handler_name)
+        return wrapper
+    return decorator
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest, который замеряет каждый запрос к Bot API."""
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        API_IN_FLIGHT.inc()
+        try:
+            code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+        except Exception:
+            API_ERRORS.inc(api_method)
+            raise
+        finally:
+            API_IN_FLIGHT.dec()
+            API_LATENCY.observe(time.perf_counter() - start, api_method)
+        if code == 429:
+            API_RETRY_AFTER.inc(api_method)
+        elif code >= 400:
+            API_ERRORS.inc(api_method)
+        return code, payload
+
+
+def refresh_gauges(*applications):
+    """Пересчитать gauge-метрики по состоянию приложений (в потоке event loop)."""
+    games = 0
+    players = 0
+    jobs = 0
+    for application in applications:
+        for data in application.chat_data.values():
+            game = data.get('game')
+            if game:
+                games += 1
+                players += len(game.players)
+        if application.job_queue:
+            jobs += len(application.job_queue.jobs())
+    ACTIVE_GAMES.set(games)
+    PLAYERS_IN_GAMES.set(players)
+    PENDING_JOBS.set(jobs)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Скрейпы Prometheus не засоряют лог
+        pass
+
+
+def start_http_server(host: str, port: int):
+    """Поднять /metrics в фоновом потоке. Возвращает сервер (или None при ошибке)."""
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.error("Metrics server failed to bind %s:%s: %s", host, port, e)
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info("Metrics server listening on http://%s:%s/metrics", host, port)
+    return server
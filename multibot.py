@@ -0,0 +1,186 @@
+# multibot.py
+"""Несколько ботов (токенов) в одном процессе и одном event loop.
+
+Боты описываются в bots.json (см. README). Общие у всех: пул HTTP-соединений
+к Bot API, планировщик JobQueue, эндпоинт /metrics и логирование. Свои у
+каждого: storage.json, история, бэкапы, админы и переопределения settings —
+они лежат в Tenant и подставляются в обработчики через tenant.py.
+
+    python multibot.py [--config bots.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+import settings
+import metrics
+import logsetup
+import tenant
+from tenant import Tenant
+from statsapi import stats_api
+
+logger = logging.getLogger(__name__)
+
+
+class SharedRequest(metrics.InstrumentedRequest):
+    """Один пул соединений на всех ботов.
+
+    Bot.initialize()/shutdown() вызываются каждым ботом, поэтому клиент
+    закрывается только когда его отпустил последний.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._users = 0
+
+    async def initialize(self):
+        self._users += 1
+        await super().initialize()
+
+    async def shutdown(self):
+        self._users -= 1
+        if self._users <= 0:
+            await super().shutdown()
+
+
+def load_config(path: str):
+    """Прочитать bots.json: список {name, token|token_env, admins, data_dir, settings}."""
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    bots = []
+    names = set()
+    for entry in entries:
+        name = entry["name"]
+        if name in names:
+            raise ValueError(f"duplicate bot name {name!r}")
+        names.add(name)
+        token = entry.get("token") or os.getenv(entry.get("token_env", ""), "")
+        if not token:
+            raise ValueError(f"bot {name!r}: no token (token / token_env)")
+        unknown = [k for k in entry.get("settings", {}) if not hasattr(settings, k)]
+        if unknown:
+            raise ValueError(f"bot {name!r}: unknown settings {unknown}")
+        shared = [k for k in entry.get("settings", {}) if k.startswith(tenant.PROCESS_SETTINGS)]
+        if shared:
+            raise ValueError(f"bot {name!r}: settings {shared} are shared by all bots in the process")
+        bots.append(dict(entry, token=token))
+    return bots
+
+
+def make_tenant(entry) -> Tenant:
+    """Tenant со своими storage/историей/бэкапами в data_dir бота."""
+    from storage import Storage
+    from history import GameHistory
+    from backup import BackupStore
+
+    data_dir = entry.get("data_dir") or os.path.join("data", entry["name"])
+    os.makedirs(data_dir, exist_ok=True)
+    admins = entry.get("admins")
+    return Tenant(
+        name=entry["name"],
+        token=entry["token"],
+        storage=Storage(os.path.join(data_dir, os.path.basename(settings.STATS_FILE))),
+        history=GameHistory(os.path.join(data_dir, os.path.basename(settings.HISTORY_DIR))),
+        backups=BackupStore(os.path.join(data_dir, os.path.basename(settings.BACKUP_DIR))),
+        admin_ids={int(a) for a in admins} if admins is not None else None,
+        settings=dict(entry.get("settings", {})),
+        stop_event=asyncio.Event(),
+    )
+
+
+async def _refresh_metrics(apps):
+    while True:
+        metrics.refresh_gauges(*apps)
+        await asyncio.sleep(settings.METRICS_REFRESH_INTERVAL)
+
+
+async def run_bot(app, shutdown: asyncio.Event):
+    """Запустить одного бота и держать до его /stop или общего сигнала."""
+    t = app.tenant
+    # Задача получает свою копию контекста: всё, что она запустит, видит этот Tenant
+    tenant.activate(t)
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.updater.start_polling(drop_pending_updates=True)
+    await app.start()
+    logger.info("Bot %s up", t.name)
+
+    waiters = [asyncio.create_task(t.stop_event.wait()), asyncio.create_task(shutdown.wait())]
+    await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    for w in waiters:
+        w.cancel()
+
+    logger.info("Stopping bot %s", t.name)
+    try:
+        if app.updater.running:
+            await app.updater.stop()
+        if app.running:
+            await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+    finally:
+        await app.shutdown()
+        t.storage.save()
+
+
+async def run(config_path: str):
+    import main as bot
+
+    entries = load_config(config_path)
+    request = SharedRequest()
+    scheduler = AsyncIOScheduler(executors={"default": AsyncIOExecutor()})
+    apps = []
+    for entry in entries:
+        t = make_tenant(entry)
+        token = tenant.activate(t)
+        try:
+            # build_application читает settings (интервалы задач) — уже с переопределениями бота
+            apps.append(bot.build_application(t.token, bot_tenant=t, request=request, scheduler=scheduler))
+        finally:
+            tenant.reset(token)
+
+    shutdown = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, shutdown.set)
+
+    refresher = None
+    if settings.METRICS_ENABLED:
+        metrics.start_http_server(settings.METRICS_HOST, settings.METRICS_PORT)
+        refresher = asyncio.create_task(_refresh_metrics(apps))
+    if settings.STATS_API_ENABLED:
+        # Один сервер на все боты, бот выбирается параметром ?bot=
+        stats_api.start_http_server(settings.STATS_API_HOST, settings.STATS_API_PORT,
+                                    settings.STATS_API_REFRESH_INTERVAL)
+
+    print(f"Bots up: {', '.join(a.tenant.name for a in apps)}")
+    results = await asyncio.gather(*(run_bot(app, shutdown) for app in apps), return_exceptions=True)
+    for app, result in zip(apps, results):
+        if isinstance(result, BaseException):
+            logger.error("Bot %s failed", app.tenant.name, exc_info=result)
+
+    if refresher:
+        refresher.cancel()
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Несколько ботов в одном процессе")
+    p.add_argument("--config", default=settings.MULTIBOT_CONFIG, help="путь к bots.json")
+    args = p.parse_args(argv)
+
+    logsetup.setup_logging()
+    asyncio.run(run(args.config))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# profiler.py
+"""Профилирование работающего event loop по запросу админа."""
+
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from collections import Counter
+
+# Одновременно может идти только один сеанс профилирования
+_running = False
+
+
+def is_running() -> bool:
+    return _running
+
+
+def reserve() -> bool:
+    """Занять профилировщик синхронно (в обработчике, до запуска фоновой задачи)."""
+    global _running
+    if _running:
+        return False
+    _running = True
+    return True
+
+
+def release():
+    global _running
+    _running = False
+
+
+def _jobs_summary(application):
+    """Сколько задач JobQueue каждого вида (по префиксу имени)."""
+    kinds = Counter()
+    if application.job_queue:
+        for job in application.job_queue.jobs():
+            name = job.name or ""
+            kind = name.rstrip("0123456789-").rstrip("_") or name
+            kinds[kind] += 1
+    return kinds
+
+
+def _chat_data_summary(application):
+    games = 0
+    players = 0
+    keys = Counter()
+    for data in application.chat_data.values():
+        keys.update(data.keys())
+        game = data.get('game')
+        if game:
+            games += 1
+            players += len(game.players)
+    return len(application.chat_data), games, players, keys
+
+
+def _state_report(application):
+    chats, games, players, keys = _chat_data_summary(application)
+    lines = [
+        f"chat_data: {chats} чатов, {games} активных игр, {players} игроков",
+        "Ключи chat_data: " + ", ".join(f"{k}={v}" for k, v in keys.most_common()),
+        "Задачи JobQueue:",
+    ]
+    jobs = _jobs_summary(application)
+    for kind, count in jobs.most_common():
+        lines.append(f"  {kind}: {count}")
+    if not jobs:
+        lines.append("  (нет)")
+    return lines
+
+
+async def capture(application, seconds: int, with_memory: bool = False, top: int = 40,
+                  reserved: bool = False) -> str:
+    """Снять cProfile (и по желанию diff tracemalloc) за `seconds` секунд работы loop.
+
+    cProfile ставит хук на текущий поток, поэтому в профиль попадают все
+    обработчики и задачи, выполняющиеся в event loop во время ожидания.
+    reserved=True — профилировщик уже занят вызывающим через reserve();
+    освобождается он здесь, по окончании.
+    """
+    if not reserved and not reserve():
+        raise RuntimeError("profiling already in progress")
+
+    started_tracemalloc = False
+    try:
+        lines = [f"Профиль event loop за {seconds} сек ({time.strftime('%Y-%m-%d %H:%M:%S')})", ""]
+        lines.append("== Состояние до ==")
+        lines.extend(_state_report(application))
+        lines.append("")
+
+        mem_before = None
+        if with_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+                started_tracemalloc = True
+            mem_before = tracemalloc.take_snapshot()
+
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            prof.disable()
+        mem_after = tracemalloc.take_snapshot() if mem_before is not None else None
+
+        out = io.StringIO()
+        stats = pstats.Stats(prof, stream=out)
+        stats.strip_dirs().sort_stats("cumulative").print_stats(top)
+        out.write("\n")
+        stats.sort_stats("tottime").print_stats(top)
+        lines.append("== cProfile ==")
+        lines.append(out.getvalue())
+
+        if mem_after is not None:
+            lines.append("== tracemalloc: рост памяти ==")
+            for stat in mem_after.compare_to(mem_before, "lineno")[:top]:
+                lines.append(str(stat))
+            lines.append("")
+
+        lines.append("== Состояние после ==")
+        lines.extend(_state_report(application))
+        return "\n".join(lines)
+    finally:
+        if started_tracemalloc:
+            tracemalloc.stop()
+        release()
@@ -0,0 +1,162 @@
+# ratelimit.py
+"""Защита от спама командами: token bucket на игрока и чат, кэш чтений, сброс нагрузки.
+
+Игровые действия (Join, hit/stand) сюда не попадают — ограничиваются только
+команды вроде /top, /stats, /balance, /daily, которые можно слать без конца.
+"""
+
+import functools
+import logging
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = metrics.Counter(
+    "bot_rate_limited_total", "Команды, отброшенные лимитом частоты", ("handler", "scope")
+)
+SHED = metrics.Counter(
+    "bot_shed_total", "Команды, сброшенные из-за перегрузки", ("handler",)
+)
+READ_CACHE_HITS = metrics.Counter(
+    "bot_read_cache_hits_total", "Ответы на команды чтения из кэша", ("name",)
+)
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, rate: float, burst: float, now: float) -> bool:
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class RateLimiter:
+    """Набор token bucket'ов по ключу (игрок или чат).
+
+    rate — токенов в секунду, burst — ёмкость. Полные корзины ничем не
+    отличаются от новых, поэтому давно не трогавшиеся ключи удаляются.
+    """
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self._buckets = {}
+        self._next_sweep = 0.0
+
+    def allow(self, key) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+        ok = bucket.take(self.rate, self.burst, now)
+        if now >= self._next_sweep:
+            self._sweep(now)
+        return ok
+
+    def _sweep(self, now):
+        refill = self.burst / self.rate if self.rate else 0
+        self._buckets = {k: b for k, b in self._buckets.items() if now - b.updated < refill}
+        self._next_sweep = now + max(refill, 1.0)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class ReadCache:
+    """Короткоживущий кэш данных для команд чтения, сгруппированный по чату.
+
+    Спам /top в одном чате считает рейтинг раз в ttl секунд; после игры
+    кэш чата сбрасывается через invalidate().
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._chats = {}
+
+    def get(self, chat_id, name: str, build):
+        entries = self._chats.setdefault(chat_id, {})
+        now = time.monotonic()
+        hit = entries.get(name)
+        if hit is not None and hit[0] > now:
+            READ_CACHE_HITS.inc(name.split(":", 1)[0])
+            return hit[1]
+        value = build()
+        entries[name] = (now + self.ttl, value)
+        if len(self._chats) > 10_000:
+            self._purge(now)
+        return value
+
+    def invalidate(self, chat_id):
+        self._chats.pop(chat_id, None)
+
+    def _purge(self, now):
+        self._chats = {
+            key: entries for key, entries in self._chats.items()
+            if any(exp > now for exp, _ in entries.values())
+        }
+
+
+class Throttle:
+    """Лимиты на игрока и чат плюс сброс некритичных команд под нагрузкой."""
+
+    def __init__(self, user_limiter: RateLimiter, chat_limiter: RateLimiter,
+                 max_in_flight: int, max_backlog: int):
+        self.users = user_limiter
+        self.chats = chat_limiter
+        self.max_in_flight = max_in_flight
+        self.max_backlog = max_backlog
+
+    def overloaded(self, application) -> bool:
+        """Исходящие запросы к Bot API упёрлись в лимит или очередь апдейтов растёт."""
+        if metrics.API_IN_FLIGHT.get() >= self.max_in_flight:
+            return True
+        # Ждущие обработчика апдейты лежат в очередях приоритетного процессора (dispatch.py)
+        backlog = application.update_queue.qsize() + getattr(application.update_processor, "pending", 0)
+        return backlog >= self.max_backlog
+
+    def check(self, handler: str, user_id, chat_id, application, shed: bool = True) -> bool:
+        if shed and self.overloaded(application):
+            SHED.inc(handler)
+            return False
+        # Сначала игрок: спамер отсекается, не расходуя лимит всего чата
+        if user_id is not None and not self.users.allow(user_id):
+            RATE_LIMITED.inc(handler, "user")
+            return False
+        if chat_id is not None and chat_id != user_id and not self.chats.allow(chat_id):
+            RATE_LIMITED.inc(handler, "chat")
+            return False
+        return True
+
+
+def throttled(throttle: Throttle, shed: bool = True):
+    """Декоратор для команд: лишние вызовы молча отбрасываются.
+
+    Ответ «слишком часто» сам был бы запросом к API, поэтому спамер
+    просто не получает ничего. shed=False — команда с записью (/daily):
+    под нагрузкой не сбрасывается, ограничивается только лимитом частоты.
+    """
+    def decorator(func):
+        name = func.__name__
+        @functools.wraps(func)
+        async def wrapper(update, context):
+            user = update.effective_user
+            chat = update.effective_chat
+            if not throttle.check(name, user.id if user else None,
+                                  chat.id if chat else None, context.application, shed):
+                logger.debug("Dropped /%s from %s", name.replace('cmd_', ''), user.id if user else None,
+                             extra={"user_id": user.id if user else None,
+                                    "group_id": chat.id if chat else None})
+                return
+            return await func(update, context)
+        return wrapper
+    return decorator
@@ -0,0 +1,251 @@
+# render.py
+"""Картинка стола в конце игры: карты дилера и игроков, очки, исходы, банк.
+
+Pillow — необязательная зависимость: без неё бот просто не шлёт картинку.
+Колода рисуется один раз в атлас (или грузится из TABLE_CARD_ATLAS),
+спрайты карт режутся из него уже в нужном масштабе и кэшируются; стол
+собирается из готовых спрайтов в отдельном потоке. file_id отправленных
+картинок запоминается — повторная картинка уходит без загрузки.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # pragma: no cover - Pillow не установлен
+    Image = None
+
+import settings
+import metrics
+from game import RANKS, SUITS, hand_value
+
+logger = logging.getLogger(__name__)
+
+RENDER_LATENCY = metrics.Histogram("bot_table_render_seconds", "Время отрисовки картинки стола")
+FILE_ID_HITS = metrics.Counter("bot_table_file_id_hits_total", "Картинки стола, отправленные по file_id")
+
+# Геометрия (px)
+CARD_W, CARD_H = 60, 84           # карта на столе
+ATLAS_SCALE = 3                   # атлас рисуется крупнее и уменьшается — сглаживание
+GAP = 8
+PAD = 16
+ROW_H = CARD_H + 2 * GAP
+LABEL_W = 220
+MAX_CARDS = 8                     # больше карт в руке в «21» почти не бывает
+
+# Цвета
+FELT = (21, 101, 72)
+FELT_DARK = (14, 74, 52)
+CARD_FACE = (253, 250, 243)
+CARD_EDGE = (18, 45, 84)
+CARD_BACK = (200, 60, 60)
+INK_BLACK = (18, 45, 84)
+INK_RED = (220, 58, 58)
+TEXT = (245, 245, 240)
+OUTCOME_COLORS = {"win": (255, 206, 58), "draw": (170, 200, 230), "lose": (235, 120, 110)}
+
+SUIT_KEYS = [s[0] for s in SUITS]   # ♠ ♥ ♦ ♣ без variation selector
+RED_SUITS = {"♥", "♦"}
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def _font(size: int):
+    for name in ("DejaVuSans-Bold.ttf", "DejaVuSans.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+# --- Атлас ---------------------------------------------------------------
+def _draw_suit(draw, suit: str, cx: float, cy: float, r: float, fill):
+    """Масть примитивами: не зависит от наличия глифов ♠♥♦♣ в шрифте."""
+    if suit == "♦":
+        draw.polygon([(cx, cy - r), (cx + r * 0.75, cy), (cx, cy + r), (cx - r * 0.75, cy)], fill=fill)
+        return
+    if suit == "♣":
+        k = r * 0.48
+        for dx, dy in ((0, -r * 0.45), (-r * 0.5, r * 0.1), (r * 0.5, r * 0.1)):
+            draw.ellipse([cx + dx - k, cy + dy - k, cx + dx + k, cy + dy + k], fill=fill)
+        draw.polygon([(cx, cy), (cx - r * 0.35, cy + r), (cx + r * 0.35, cy + r)], fill=fill)
+        return
+    # Сердце; пика — перевёрнутое сердце с ножкой
+    sign = 1 if suit == "♥" else -1
+    k = r * 0.52
+    top = cy - sign * r * 0.35
+    for dx in (-r * 0.48, r * 0.48):
+        draw.ellipse([cx + dx - k, top - k, cx + dx + k, top + k], fill=fill)
+    draw.polygon([(cx - r * 0.98, top + sign * r * 0.12), (cx + r * 0.98, top + sign * r * 0.12),
+                  (cx, cy + sign * r)], fill=fill)
+    if suit == "♠":
+        draw.polygon([(cx, cy), (cx - r * 0.35, cy + r * 1.05), (cx + r * 0.35, cy + r * 1.05)], fill=fill)
+
+
+def _draw_card(rank: str | None, suit: str | None, w: int, h: int, font):
+    card = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+    d = ImageDraw.Draw(card)
+    radius = w // 9
+    edge = max(2, w // 30)
+    if rank is None:
+        d.rounded_rectangle([0, 0, w - 1, h - 1], radius, fill=CARD_BACK, outline=CARD_EDGE, width=edge)
+        inset = w // 8
+        d.rounded_rectangle([inset, inset, w - 1 - inset, h - 1 - inset], radius // 2,
+                            outline=CARD_FACE, width=edge)
+        return card
+    ink = INK_RED if suit in RED_SUITS else INK_BLACK
+    d.rounded_rectangle([0, 0, w - 1, h - 1], radius, fill=CARD_FACE, outline=CARD_EDGE, width=edge)
+    d.text((w * 0.1, h * 0.05), rank, font=font, fill=ink)
+    _draw_suit(d, suit, w * 0.22, h * 0.36, w * 0.1, ink)
+    _draw_suit(d, suit, w * 0.58, h * 0.64, w * 0.24, ink)
+    return card
+
+
+def build_atlas(card_w: int = CARD_W * ATLAS_SCALE, card_h: int = CARD_H * ATLAS_SCALE):
+    """Вся колода в одной картинке: строки — масти (SUITS), столбцы — RANKS + рубашка."""
+    atlas = Image.new("RGBA", (card_w * (len(RANKS) + 1), card_h * len(SUIT_KEYS)), (0, 0, 0, 0))
+    font = _font(int(card_h * 0.2))
+    for row, suit in enumerate(SUIT_KEYS):
+        for col, rank in enumerate(RANKS):
+            atlas.paste(_draw_card(rank, suit, card_w, card_h, font), (col * card_w, row * card_h))
+    atlas.paste(_draw_card(None, None, card_w, card_h, font), (len(RANKS) * card_w, 0))
+    return atlas
+
+
+class SpriteSheet:
+    """Спрайты карт нужного размера, вырезанные из атласа один раз."""
+
+    def __init__(self, atlas, card_w: int = CARD_W, card_h: int = CARD_H):
+        cols = len(RANKS) + 1
+        src_w = atlas.width // cols
+        src_h = atlas.height // len(SUIT_KEYS)
+        self.sprites = {}
+        for row, suit in enumerate(SUIT_KEYS):
+            for col, rank in enumerate(RANKS):
+                box = (col * src_w, row * src_h, (col + 1) * src_w, (row + 1) * src_h)
+                self.sprites[(rank, suit)] = atlas.crop(box).resize((card_w, card_h), Image.LANCZOS)
+        back = (len(RANKS) * src_w, 0, cols * src_w, src_h)
+        self.back = atlas.crop(back).resize((card_w, card_h), Image.LANCZOS)
+
+    def get(self, rank: str, suit: str):
+        return self.sprites.get((rank, suit[0]), self.back)
+
+
+_sheet = None
+_sheet_lock = threading.Lock()
+
+
+def sprites() -> SpriteSheet:
+    """Атлас грузится/рисуется один раз на процесс (первый вызов — в рабочем потоке)."""
+    global _sheet
+    if _sheet is None:
+        with _sheet_lock:
+            if _sheet is None:
+                if settings.TABLE_CARD_ATLAS:
+                    atlas = Image.open(settings.TABLE_CARD_ATLAS).convert("RGBA")
+                else:
+                    atlas = build_atlas()
+                _sheet = SpriteSheet(atlas)
+    return _sheet
+
+
+# --- Стол ----------------------------------------------------------------
+def table_snapshot(game, max_players: int):
+    """Неизменяемый снимок итогов игры для рендера в другом потоке.
+
+    max_players — настройка бота (conf): рабочий поток её сам не прочитает.
+    """
+    dealer = tuple((c.rank, c.suit) for c in game.dealer)
+    players = tuple(
+        (p["name"], tuple((c.rank, c.suit) for c in p["hand"]), *game.outcomes[uid])
+        for uid, p in game.players.items()
+    )
+    return dealer, hand_value(game.dealer), players, game.bank, max_players
+
+
+def _row(canvas, draw, sheet, y, label, cards, font, small, note=None, note_color=TEXT):
+    draw.text((PAD, y + GAP), label, font=font, fill=TEXT)
+    if note:
+        draw.text((PAD, y + GAP + font.size + 6), note, font=small, fill=note_color)
+    x = PAD + LABEL_W
+    for rank, suit in cards[:MAX_CARDS]:
+        sprite = sheet.get(rank, suit)
+        canvas.paste(sprite, (x, y + GAP), sprite)
+        x += CARD_W // 2 + GAP   # карты внахлёст
+
+
+def render_table(snapshot) -> bytes:
+    """PNG стола из table_snapshot()."""
+    dealer, dealer_score, players, bank, max_players = snapshot
+    sheet = sprites()
+    width = PAD * 2 + LABEL_W + (CARD_W // 2 + GAP) * (MAX_CARDS - 1) + CARD_W
+    shown = players[:max_players]
+    height = PAD * 2 + 40 + ROW_H * (len(shown) + 1) + (30 if len(players) > len(shown) else 0)
+
+    canvas = Image.new("RGB", (width, height), FELT)
+    draw = ImageDraw.Draw(canvas)
+    font = _font(18)
+    small = _font(14)
+    draw.text((PAD, PAD), f"Банк: {bank}", font=font, fill=TEXT)
+
+    y = PAD + 40
+    draw.rectangle([0, y, width, y + ROW_H], fill=FELT_DARK)
+    bust = " перебор" if dealer_score > 21 else ""
+    _row(canvas, draw, sheet, y, "Дилер", dealer, font, small, f"{dealer_score}{bust}")
+    for name, cards, score, outcome, delta in shown:
+        y += ROW_H
+        sign = "+" if delta > 0 else ""
+        _row(canvas, draw, sheet, y, name[:18], cards, font, small,
+             f"{score} · {outcome.upper()} {sign}{delta}", OUTCOME_COLORS.get(outcome, TEXT))
+    if len(players) > len(shown):
+        draw.text((PAD, y + ROW_H + 4), f"… и ещё {len(players) - len(shown)} игроков — см. текст",
+                  font=small, fill=TEXT)
+
+    buf = io.BytesIO()
+    canvas.save(buf, "PNG", optimize=False)
+    return buf.getvalue()
+
+
+class TableImages:
+    """Отрисовка в пуле потоков + кэш file_id по содержимому картинки."""
+
+    def __init__(self, workers: int = 1, cache_size: int = 1000):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+        self._file_ids = OrderedDict()
+        self._cache_size = cache_size
+
+    async def render(self, snapshot) -> bytes:
+        loop = asyncio.get_running_loop()
+        with RENDER_LATENCY.time():
+            return await loop.run_in_executor(self._executor, render_table, snapshot)
+
+    async def send(self, bot, chat_id: int, game, max_players: int):
+        """Отправить картинку стола; ошибки только логируются — текст итогов уже ушёл."""
+        snapshot = table_snapshot(game, max_players)
+        # file_id действителен только для своего бота
+        key = (bot.id, hashlib.sha1(repr(snapshot).encode("utf-8")).hexdigest())
+        try:
+            file_id = self._file_ids.get(key)
+            if file_id is not None:
+                self._file_ids.move_to_end(key)
+                FILE_ID_HITS.inc()
+                await bot.send_photo(chat_id, file_id)
+                return
+            png = await self.render(snapshot)
+            msg = await bot.send_photo(chat_id, png, filename=f"table-{game.id}.png")
+            if msg.photo:
+                self._file_ids[key] = msg.photo[-1].file_id
+                if len(self._file_ids) > self._cache_size:
+                    self._file_ids.popitem(last=False)
+        except Exception:
+            logger.exception("Failed to send table image to %s", chat_id,
+                             extra={"group_id": chat_id, "game_id": game.id})
@@ -0,0 +1,23 @@
+#!/bin/bash
+# Восстановить storage.json из бэкапов: ./restore_bot.sh [--upto ИМЯ_БЭКАПА]
+BOT_DIR="$(cd "$(dirname "$0")" && pwd)"
+BOT_NAME="$(basename "$BOT_DIR")"
+
+cd "$BOT_DIR" || exit 1
+
+# Активируем виртуальное окружение
+source venv/bin/activate 2>/dev/null || true
+
+echo "Доступные бэкапы:"
+python3 backup.py list
+
+# Бот должен быть остановлен, иначе он перезапишет восстановленный файл
+"$BOT_DIR/stop_bot.sh"
+
+echo "Восстановление storage.json бота $BOT_NAME..."
+if ! python3 backup.py restore "$@"; then
+    echo "Ошибка восстановления, бот не запущен."
+    exit 1
+fi
+
+"$BOT_DIR/run_bot.sh"
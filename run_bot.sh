@@ -23,8 +23,14 @@ echo "Запуск бота $BOT_NAME..."
 # Активируем виртуальное окружение
 source venv/bin/activate 2>/dev/null || true
 
+# Есть bots.json — запускаем все боты одним процессом, иначе один бот из TG_BOT_TOKEN
+ENTRY="main.py"
+if [ -f "$BOT_DIR/bots.json" ]; then
+    ENTRY="multibot.py"
+fi
+
 # Запускаем бота в фоне
-nohup python3 main.py > "$LOG_DIR/${BOT_NAME}_stdout_$(date +%Y%m%d).log" 2>&1 &
+nohup python3 "$ENTRY" > "$LOG_DIR/${BOT_NAME}_stdout_$(date +%Y%m%d).log" 2>&1 &
 
 # Сохраняем PID
 echo $! > "$PID_FILE"
@@ -13,8 +13,91 @@ PLAYER_EXPIRE_TIMEOUT = 45
 # Файл, где хранится статистика (создаётся автоматически)
 STATS_FILE = 'storage.json'
 
+# История игр и сводки по дням/неделям для /stats и /top today|week
+HISTORY_DIR = 'history'
+HISTORY_KEEP_DAYS = 35          # сколько дневных сводок хранить
+HISTORY_KEEP_WEEKS = 12         # сколько недельных сводок хранить
+HISTORY_FLUSH_INTERVAL = 60     # как часто записывать сводки в rollups.json (сек)
+
+# Бэкапы storage.json (полные + инкрементальные, gzip)
+BACKUP_DIR = 'backups'
+BACKUP_ENABLED = True           # делать бэкапы из работающего бота
+BACKUP_INTERVAL = 900           # как часто снимать инкремент (сек)
+BACKUP_FULL_EVERY = 96          # полный снимок после стольких инкрементов
+BACKUP_KEEP_CHAINS = 3          # сколько цепочек «полный + инкременты» хранить
+
+# Несколько ботов в одном процессе (multibot.py)
+MULTIBOT_CONFIG = 'bots.json'   # список ботов: токены, админы, папки данных, настройки
+
+# Холодный архив: неактивные игроки и чаты, из которых бота удалили
+ARCHIVE_DIR = 'archive'         # рядом с storage.json
+ARCHIVE_ENABLED = True          # переносить неактивных игроков в архив
+ARCHIVE_USER_IDLE_DAYS = 90     # через сколько дней без активности игрок уходит в архив
+ARCHIVE_INTERVAL = 86400        # как часто проверять (сек)
+
 # Настройки автозапуска игр
 AUTO_GAME_ENABLED = False        # включен ли автозапуск
 AUTO_GAME_INTERVAL = 3600       # интервал в секундах (1 час)
 AUTO_GAME_PRICE = 20            # ставка для автозапуска
 AUTO_GAME_MIN_PLAYERS = 1       # минимальное количество игроков для автозапуска
+AUTO_GAME_RESTART_DELAY = 10    # пауза перед следующей автоигрой после окончания (сек)
+
+# Картинка стола в конце игры (нужен Pillow: pip install Pillow)
+TABLE_IMAGE_ENABLED = True      # отправлять картинку, если Pillow установлен
+TABLE_IMAGE_MAX_PLAYERS = 12    # сколько игроков рисовать, остальные — только в тексте
+TABLE_CARD_ATLAS = None         # свой атлас карт (PNG: строки ♠♥♦♣, столбцы A..K + рубашка); None — нарисовать
+TABLE_RENDER_WORKERS = 1        # потоков для отрисовки
+
+# Метрики Prometheus (локальный HTTP-эндпоинт /metrics)
+METRICS_ENABLED = True          # включить сбор и эндпоинт
+METRICS_HOST = '127.0.0.1'      # адрес эндпоинта
+METRICS_PORT = 9108             # порт эндпоинта
+METRICS_REFRESH_INTERVAL = 15   # как часто пересчитывать gauge-метрики (сек)
+
+# HTTP API статистики только для чтения (для дашбордов и сайта, см. statsapi.py)
+STATS_API_ENABLED = False
+STATS_API_HOST = '127.0.0.1'
+STATS_API_PORT = 9109
+STATS_API_REFRESH_INTERVAL = 30   # как часто пересобирать снимок (сек); он же max-age ответов
+
+# Профилирование по команде /profile
+PROFILE_DEFAULT_SECONDS = 30    # длительность по умолчанию (сек)
+PROFILE_MAX_SECONDS = 300       # максимальная длительность (сек)
+
+# Отсев дублей callback-запросов (двойные нажатия, повторы Telegram)
+CALLBACK_DEDUP_QUERY_TTL = 300   # сколько помнить id callback-запросов (сек)
+CALLBACK_DEDUP_ACTION_TTL = 60   # сколько помнить обработанное действие на сообщении (сек)
+
+# Защита от спама командами (/top, /stats, /balance, /daily и т.п.; игровые кнопки не ограничиваются)
+RATE_USER_PER_MIN = 10          # команд в минуту от одного игрока
+RATE_USER_BURST = 5             # сколько можно подряд без паузы
+RATE_CHAT_PER_MIN = 40          # команд в минуту на весь чат
+RATE_CHAT_BURST = 15
+READ_CACHE_TTL = 10             # сколько секунд отдавать /top, /stats, /globaltop из кэша
+SHED_API_IN_FLIGHT = 128        # при стольких незавершённых запросах к API некритичные команды отбрасываются
+SHED_UPDATE_BACKLOG = 200       # ... или при такой очереди необработанных апдейтов
+
+# Обработка апдейтов по приоритетам: ходы в играх → команды админа → остальное
+UPDATE_WORKERS = 4              # сколько апдейтов обрабатывается одновременно (один — только для ходов)
+UPDATE_QUEUE_LIMITS = {         # макс. очередь по полосам; игровые апдейты не ограничены
+    "control": 500,
+    "read": 200,
+}
+
+# Живой стол в группе: статусы игроков и карта дилера во время раздачи
+LIVE_TABLE_ENABLED = False
+LIVE_TABLE_EDIT_INTERVAL = 3    # не чаще одной правки сообщения стола за столько секунд
+LIVE_TABLE_MAX_PLAYERS = 50     # сколько игроков показывать построчно (не больше, чем влезет в 4096 символов)
+
+# Массовые операции админа (/airdrop, /importcsv, /exportcsv)
+BULK_PROGRESS_EVERY = 5000      # как часто сообщать о прогрессе (строк)
+
+# Логирование (JSON-строки, запись в отдельном потоке, ротация по размеру)
+LOG_DIR = 'logs'
+LOG_FILE = 'bot.log'
+LOG_MAX_BYTES = 10 * 1024 * 1024   # размер файла до ротации
+LOG_BACKUP_COUNT = 5               # сколько старых файлов хранить
+LOG_CONSOLE = False                # дублировать в stderr (при запуске в терминале — всегда)
+LOG_SAMPLE_RATES = {
+    'action': 0.1,                 # доля записей о ходах hit/stand
+}
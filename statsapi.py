@@ -0,0 +1,245 @@
+# statsapi.py
+"""Локальный read-only HTTP API со статистикой для дашбордов и сайта.
+
+Запросы обслуживаются в потоках HTTP-сервера и читают только готовый
+неизменяемый снимок: он пересобирается задачей JobQueue раз в
+STATS_API_REFRESH_INTERVAL секунд, причём заново сериализуются лишь
+изменившиеся чаты. Горячие структуры storage сервер не трогает.
+
+    GET /api/leaderboard?key=money&limit=10         глобальный топ
+    GET /api/chats/<chat_id>                        игры и число игроков чата
+    GET /api/chats/<chat_id>/leaderboard?key=games  топ чата
+    GET /api/chats/<chat_id>/users/<user_id>        игрок в чате
+    GET /api/users/<user_id>                        игрок по всем чатам
+
+В мультибот-режиме бот выбирается параметром ?bot=<name>. Ответы несут
+ETag; If-None-Match с тем же значением получает 304 без тела.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+from leaderboard import KEYS
+from storage import PROFILES_KEY
+
+logger = logging.getLogger(__name__)
+
+TOP_LIMIT = 100          # сколько мест рейтинга держать в снимке
+DEFAULT_BOT = "default"  # имя единственного бота вне мультибот-режима
+
+API_REQUESTS = metrics.Counter("bot_stats_api_requests_total", "Запросы к HTTP API статистики", ("status",))
+SNAPSHOT_BUILD = metrics.Histogram("bot_stats_api_snapshot_seconds", "Сборка снимка для HTTP API")
+
+
+class ChatView:
+    """Неизменяемое представление чата в снимке."""
+
+    __slots__ = ("games_played", "users", "tops")
+
+    def __init__(self, chat: dict):
+        self.games_played = chat.get("games_played", 0)
+        self.users = chat.get("users", {})
+        # Топы по каждому ключу считаются один раз при сборке, а не на каждый запрос
+        self.tops = {
+            key: sorted(((u.get(key, 0), uid) for uid, u in self.users.items()), reverse=True)[:TOP_LIMIT]
+            for key in KEYS
+        }
+
+
+class Snapshot:
+    """Снимок для HTTP API. После сборки не меняется — читается из любых потоков."""
+
+    def __init__(self, chats: dict, names: dict, user_chats: dict, global_tops: dict):
+        self.chats = chats                # chat_id → ChatView
+        self.names = names                # user_id → имя
+        self.user_chats = user_chats      # user_id → кортеж chat_id
+        self.global_tops = global_tops    # key → [(user_id, value)]
+        self._responses = {}              # путь с запросом → (etag, тело), заполняется лениво
+
+    def name(self, uid) -> str:
+        return self.names.get(str(uid), {}).get("name", "Anon")
+
+
+def build_snapshot(prev, chats_raw: dict, removed, global_tops: dict):
+    """Собрать новый снимок из предыдущего и изменённых чатов (в рабочем потоке)."""
+    chats = dict(prev.chats) if prev else {}
+    names = prev.names if prev else {}
+    for cid in removed:
+        chats.pop(cid, None)
+    for cid, raw in chats_raw.items():
+        if cid == PROFILES_KEY:
+            names = json.loads(raw)
+        else:
+            chats[cid] = ChatView(json.loads(raw))
+    if prev is not None and not chats_raw and not removed:
+        user_chats = prev.user_chats
+    else:
+        user_chats = {}
+        for cid, view in chats.items():
+            for uid in view.users:
+                user_chats.setdefault(uid, []).append(cid)
+        user_chats = {uid: tuple(cids) for uid, cids in user_chats.items()}
+    return Snapshot(chats, names, user_chats, global_tops)
+
+
+class StatsAPI:
+    """Снимки по ботам + HTTP-сервер, который их отдаёт."""
+
+    def __init__(self):
+        # имя бота → Snapshot; пишет только event loop, подменяя словарь целиком
+        self._snapshots = {}
+
+    def get(self, bot: str | None):
+        """Снимок бота; без имени — единственного или "default".
+
+        LookupError — имя нужно, а не указано (несколько ботов, default среди них нет).
+        """
+        snapshots = self._snapshots
+        if bot is None:
+            if len(snapshots) == 1:
+                return next(iter(snapshots.values()))
+            if DEFAULT_BOT not in snapshots and len(snapshots) > 1:
+                raise LookupError("bot parameter required")
+            return snapshots.get(DEFAULT_BOT)
+        return snapshots.get(bot)
+
+    async def refresh(self, bot: str, storage):
+        """Обновить снимок бота. Сериализация — в event loop, разбор и индексы — в потоке."""
+        start = time.perf_counter()
+        prev = self._snapshots.get(bot)
+        if prev is None:
+            chats_raw, removed = storage.snapshot_chats(consumer="api")
+        else:
+            chats_raw, removed = storage.snapshot_chats(storage.take_dirty("api"), consumer="api")
+        global_tops = {
+            key: [(str(row["user_id"]), row[key]) for row in storage.global_top(key, TOP_LIMIT)]
+            for key in KEYS
+        }
+        if prev is not None and not chats_raw and not removed and global_tops == prev.global_tops:
+            return prev
+        snap = await asyncio.to_thread(build_snapshot, prev, chats_raw, removed, global_tops)
+        self._snapshots = {**self._snapshots, bot: snap}
+        SNAPSHOT_BUILD.observe(time.perf_counter() - start)
+        return snap
+
+    # --- HTTP -------------------------------------------------------------
+    def respond(self, path: str):
+        """(статус, etag, тело) для запроса; тело кэшируется в снимке."""
+        url = urlsplit(path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            snap = self.get(query.pop("bot", None))
+        except LookupError:
+            return 400, None, b'{"error": "bot parameter required"}'
+        if snap is None:
+            return 503, None, b'{"error": "snapshot not ready"}'
+        cached = snap._responses.get(path)
+        if cached is not None:
+            return 200, *cached
+        try:
+            payload = route(snap, url.path.rstrip("/").split("/")[1:], query)
+        except (ValueError, KeyError):
+            return 400, None, b'{"error": "bad request"}'
+        if payload is None:
+            return 404, None, b'{"error": "not found"}'
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+        if len(snap._responses) < 10_000:
+            snap._responses[path] = (etag, body)
+        return 200, etag, body
+
+    def start_http_server(self, host: str, port: int, max_age: int):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, etag, body = api.respond(self.path)
+                if etag is not None and self.headers.get("If-None-Match") == etag:
+                    status, body = 304, b""
+                API_REQUESTS.inc(str(status))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Cache-Control", f"max-age={max_age}")
+                if etag is not None:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            logger.error("Stats API failed to bind %s:%s: %s", host, port, e)
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="stats-api", daemon=True).start()
+        logger.info("Stats API listening on http://%s:%s/api/", host, port)
+        return server
+
+
+def _top(snap, rows, limit):
+    return [{"user_id": int(uid), "name": snap.name(uid), "value": value} for uid, value in rows[:limit]]
+
+
+def _limit(query):
+    return max(1, min(int(query.get("limit", 10)), TOP_LIMIT))
+
+
+def _key(query, default):
+    key = query.get("key", default)
+    if key not in KEYS:
+        raise ValueError(key)
+    return key
+
+
+def _user(snap, cid, uid):
+    user = snap.chats[cid].users[uid]
+    return {"chat_id": int(cid), "user_id": int(uid), "name": snap.name(uid), **user}
+
+
+def route(snap, parts, query):
+    """Разбор пути /api/...; None — не найдено."""
+    if not parts or parts[0] != "api":
+        return None
+    parts = parts[1:]
+    if parts == ["leaderboard"]:
+        key = _key(query, "money")
+        return {"key": key, "top": _top(snap, snap.global_tops[key], _limit(query))}
+    if len(parts) >= 2 and parts[0] == "chats":
+        cid = str(int(parts[1]))
+        view = snap.chats.get(cid)
+        if view is None:
+            return None
+        if len(parts) == 2:
+            return {"chat_id": int(cid), "games_played": view.games_played, "players": len(view.users)}
+        if parts[2:] == ["leaderboard"]:
+            key = _key(query, "games")
+            rows = [(uid, value) for value, uid in view.tops[key]]
+            return {"chat_id": int(cid), "key": key, "top": _top(snap, rows, _limit(query))}
+        if len(parts) == 4 and parts[2] == "users":
+            uid = str(int(parts[3]))
+            return _user(snap, cid, uid) if uid in view.users else None
+        return None
+    if len(parts) == 2 and parts[0] == "users":
+        uid = str(int(parts[1]))
+        cids = snap.user_chats.get(uid)
+        if not cids:
+            return None
+        chats = {cid: snap.chats[cid].users[uid] for cid in cids}
+        total = {key: sum(c.get(key, 0) for c in chats.values()) for key in KEYS}
+        return {"user_id": int(uid), "name": snap.name(uid), "total": total, "chats": chats}
+    return None
+
+
+# Singleton instance
+stats_api = StatsAPI()
@@ -2,13 +2,26 @@
 import json, os, time
 from threading import Lock
 import settings
+import metrics
+from archive import ColdArchive
+from leaderboard import GlobalLeaderboard
+from tenant import TenantLocal
 
 _lock = Lock()
 
+# Кто забирает изменённые чаты: бэкапы (main.backup_job) и снимки HTTP API (statsapi.py)
+DIRTY_CONSUMERS = ("backup", "api")
+
+# Ключ таблицы профилей в storage.json (остальные ключи — id чатов)
+PROFILES_KEY = "profiles"
+
 class Storage:
     def __init__(self, path: str = settings.STATS_FILE):
         self.path = path
         self._data = {}
+        self._dirty = {c: set() for c in DIRTY_CONSUMERS}   # чаты, изменённые с последнего снимка
+        self.archive = ColdArchive(os.path.join(os.path.dirname(path), settings.ARCHIVE_DIR))
+        self._restored = set()  # (chat_id, user_id | None), поднятые из архива до ближайшего save()
         self.load()
 
     # --- File IO --------------------------------------------------------
@@ -18,57 +31,303 @@ class Storage:
                 self._data = json.load(f)
         else:
             self._data = {}
+        # Профили игроков (имя и т.п.) — один на игрока, в чатах только статистика
+        self.profiles = self._data.setdefault(PROFILES_KEY, {})
+        migrated = self._migrate_profiles()
+        # Глобальный рейтинг строится один раз, дальше — только по дельтам
+        self.board = GlobalLeaderboard.from_chats(dict(self.chats()), self.profiles)
+        self._dirty = {c: set() for c in DIRTY_CONSUMERS}
+        if migrated:
+            self.save()
+
+    def _migrate_profiles(self) -> bool:
+        """Старый формат: имя лежало в записи игрока в каждом чате. Переносим в профили."""
+        migrated = False
+        for _, chat in self.chats():
+            for uid, user in chat.get("users", {}).items():
+                if "name" in user:
+                    self._adopt_name(uid, user.pop("name"))
+                    migrated = True
+        return migrated
 
     def save(self):
+        start = time.perf_counter()
         tmp = self.path + '.tmp'
         with open(tmp, 'w', encoding='utf-8') as f:
             json.dump(self._data, f, ensure_ascii=False, indent=2)
+            size = f.tell()
         os.replace(tmp, self.path)
+        metrics.STORAGE_SAVE_LATENCY.observe(time.perf_counter() - start)
+        metrics.STORAGE_SAVE_BYTES.observe(size)
+        # Поднятые из архива записи уже на диске — теперь их можно убрать из архива
+        restored, self._restored = self._restored, set()
+        by_chat = {}
+        for cid, uid in restored:
+            by_chat.setdefault(cid, []).append(uid)
+        for cid, uids in by_chat.items():
+            self.archive.drop(cid, [uid for uid in uids if uid is not None], chat=None in uids)
+
+    # --- Snapshots ------------------------------------------------------
+    def touch(self, chat_id):
+        """Пометить чат изменённым (попадёт в следующий инкрементальный бэкап и снимок API)."""
+        cid = str(chat_id)
+        for dirty in self._dirty.values():
+            dirty.add(cid)
+
+    def take_dirty(self, consumer: str = "backup"):
+        dirty, self._dirty[consumer] = self._dirty[consumer], set()
+        return dirty
+
+    def snapshot_chats(self, chat_ids=None, consumer: str = "backup"):
+        """Сериализовать чаты на текущий момент: ({chat_id: json}, [удалённые chat_id]).
+
+        Вызывается в потоке event loop и не прерывается другими обработчиками,
+        поэтому каждый снимок согласован. None — все чаты (полный снимок
+        для consumer: его список изменённых сбрасывается).
+        """
+        if chat_ids is None:
+            self._dirty[consumer] = set()
+            chat_ids = list(self._data)
+        raw, removed = {}, []
+        for cid in chat_ids:
+            chat = self._data.get(cid)
+            if chat is None:
+                removed.append(cid)
+            else:
+                raw[cid] = json.dumps(chat, ensure_ascii=False)
+        return raw, removed
 
     # --- Helpers --------------------------------------------------------
+    def chats(self):
+        """(chat_id, чат) по всем чатам в памяти — без таблицы профилей."""
+        for cid, chat in self._data.items():
+            if cid != PROFILES_KEY and isinstance(chat, dict):
+                yield cid, chat
+
+    def name(self, user_id) -> str:
+        profile = self.profiles.get(str(user_id))
+        return profile["name"] if profile else "Anon"
+
+    def _set_name(self, user_id, name: str | None):
+        """Создать профиль или обновить имя — одна запись на игрока для всех чатов."""
+        uid = str(user_id)
+        profile = self.profiles.get(uid)
+        if profile is None:
+            self.profiles[uid] = {"name": name or "Anon", "since": int(time.time())}
+        elif name and profile["name"] != name:
+            profile["name"] = name
+        else:
+            return
+        self.touch(PROFILES_KEY)
+
+    def _adopt_name(self, user_id, name):
+        """Имя из записи старого формата (storage.json, архив): не затираем известное."""
+        if name and (name != "Anon" or str(user_id) not in self.profiles):
+            self._set_name(user_id, name)
+
+    def _find_chat(self, chat_id: int):
+        """Чат без создания: из памяти, из архива (если бот из него уходил) или None."""
+        cid = str(chat_id)
+        chat = self._data.get(cid)
+        if chat is None and cid in self.archive:
+            chat = self._restore_chat(cid)
+        return chat
+
     def _chat(self, chat_id: int):
-        chat = self._data.setdefault(str(chat_id), {"games_played": 0, "users": {}})
+        chat = self._find_chat(chat_id)
+        if chat is None or "users" not in chat:
+            chat = self._data.setdefault(str(chat_id), {})
+            chat.setdefault("games_played", 0)
+            chat.setdefault("users", {})
+            self.touch(chat_id)
         return chat
 
+    def _restore_chat(self, cid: str):
+        entry = self.archive.read(cid)
+        if entry["chat"] is None:
+            return None
+        chat = dict(entry["chat"], users=entry["users"])
+        self._data[cid] = chat
+        for uid_str, user in chat["users"].items():
+            self._adopt_name(uid_str, user.pop("name", None))
+            self.board.join(int(uid_str), user)
+            # Из архива при save() уходят только поднятые записи: игроки, которых
+            # archive_users вернёт туда до сохранения, должны остаться
+            self._restored.add((cid, uid_str))
+        self._restored.add((cid, None))
+        self.touch(cid)
+        return chat
+
+    def _seen(self, chat_id, user, now=None):
+        """Отметить активность игрока (не чаще раза в час, чтобы не дёргать бэкапы)."""
+        now = int(now or time.time())
+        if now - user.get("last_seen", 0) >= 3600:
+            user["last_seen"] = now
+            self.touch(chat_id)
+
+    def find_user(self, chat_id: int, user_id: int):
+        """Запись игрока или None. Архивный игрок прозрачно возвращается в storage."""
+        chat = self._find_chat(chat_id)
+        user = chat.get("users", {}).get(str(user_id)) if chat else None
+        if user is None and self.archive.has_user(chat_id, user_id):
+            user = self.archive.peek_user(chat_id, user_id)
+            if user is not None:
+                self._adopt_name(user_id, user.pop("name", None))
+                self._chat(chat_id)["users"][str(user_id)] = user
+                self.board.join(user_id, user)
+                self._restored.add((str(chat_id), str(user_id)))
+                self._seen(chat_id, user)
+        return user
+
+    def has_user(self, chat_id: int, user_id: int) -> bool:
+        """Есть ли игрок в чате (в памяти или в архиве) — без подъёма из архива."""
+        chat = self._data.get(str(chat_id))
+        if chat is not None and str(user_id) in chat.get("users", {}):
+            return True
+        return self.archive.has_user(chat_id, user_id)
+
+    def archived_count(self, chat_id: int) -> int:
+        """Сколько игроков чата лежит только в архиве."""
+        chat = self._data.get(str(chat_id)) or {}
+        users = chat.get("users", {})
+        return sum(1 for uid in self.archive.user_ids(chat_id) if uid not in users)
+
     def get_user(self, chat_id: int, user_id: int, name: str | None = None):
-        chat = self._chat(chat_id)
-        user = chat["users"].setdefault(str(user_id), {
-            "name": name or "Anon",
-            "money": 0,
-            "wins": 0,
-            "games": 0,
-            "last_daily": 0
-        })
+        """Статистика игрока в чате; создаётся при первой записи.
+
+        name передают действия самого игрока — оно обновляет профиль (имя
+        хранится один раз, см. name()) и отметку активности.
+        """
+        user = self.find_user(chat_id, user_id)
+        if user is None:
+            user = self._chat(chat_id)["users"][str(user_id)] = {
+                "money": 0,
+                "wins": 0,
+                "games": 0,
+                "last_daily": 0,
+                "last_seen": int(time.time()),
+            }
+            self.board.join(user_id, user)
+            self.touch(chat_id)
+        if name or str(user_id) not in self.profiles:
+            self._set_name(user_id, name)
         if name:
-            user["name"] = name
+            self._seen(chat_id, user)
         return user
 
+    # --- Archive --------------------------------------------------------
+    def idle_users(self, cutoff: float, keep=()):
+        """{chat_id: [user_id, ...]} игроков без активности с cutoff.
+
+        keep — пары (chat_id, user_id), которые трогать нельзя (идущие игры).
+        Старые записи без last_seen получают его сейчас: отсчёт простоя
+        начинается с первой компактизации.
+        """
+        now = int(time.time())
+        idle = {}
+        for cid, chat in self.chats():
+            for uid, user in chat.get("users", {}).items():
+                if "last_seen" not in user:
+                    user["last_seen"] = now
+                    self.touch(cid)
+                elif user["last_seen"] < cutoff and (int(cid), int(uid)) not in keep:
+                    idle.setdefault(cid, []).append(uid)
+        return idle
+
+    def archive_users(self, chat_id, user_ids):
+        """Перенести игроков чата в архив: сначала запись архива, потом удаление из storage."""
+        cid = str(chat_id)
+        users = self._data[cid]["users"]
+        moving = {str(uid): users[str(uid)] for uid in user_ids if str(uid) in users}
+        if not moving:
+            return 0
+        self.archive.put_users(cid, moving)
+        for uid, user in moving.items():
+            del users[uid]
+            self.board.leave(int(uid), user)
+            self._restored.discard((cid, uid))
+        self.touch(cid)
+        return len(moving)
+
+    def archive_chat(self, chat_id):
+        """Бот покинул чат: весь чат уходит в архив до следующего обращения."""
+        cid = str(chat_id)
+        chat = self._data.get(cid)
+        if chat is None:
+            return False
+        self.archive.put_chat(cid, chat)
+        del self._data[cid]
+        for uid, user in chat.get("users", {}).items():
+            self.board.leave(int(uid), user)
+        self._restored = {r for r in self._restored if r[0] != cid}
+        self.touch(cid)
+        return True
+
     # --- Stats API ------------------------------------------------------
     def add_game(self, chat_id: int):
         chat = self._chat(chat_id)
         chat["games_played"] += 1
+        self.touch(chat_id)
 
     def add_win(self, chat_id: int, user_id: int):
         user = self.get_user(chat_id, user_id)
         user["wins"] += 1
+        self.touch(chat_id)
+        self.board.add(user_id, "wins", 1)
+
+    def add_user_game(self, chat_id: int, user_id: int):
+        user = self.get_user(chat_id, user_id)
+        user["games"] += 1
+        self._seen(chat_id, user)
+        self.touch(chat_id)
+        self.board.add(user_id, "games", 1)
 
     def add_money(self, chat_id: int, user_id: int, delta: int):
         user = self.get_user(chat_id, user_id)
         user["money"] += delta
+        self.touch(chat_id)
+        self.board.add(user_id, "money", delta)
 
     def set_daily(self, chat_id: int, user_id: int, timestamp: float):
         user = self.get_user(chat_id, user_id)
         user["last_daily"] = timestamp
+        self.touch(chat_id)
+
+    def get_setting(self, chat_id: int, key: str, default=None):
+        chat = self._find_chat(chat_id)
+        return chat.get(key, default) if chat else default
+
+    def set_setting(self, chat_id: int, key: str, value):
+        self._chat(chat_id)[key] = value
+        self.touch(chat_id)
 
     # --- Queries --------------------------------------------------------
     def leaderboard(self, chat_id: int, key: str = "money", limit: int = 5):
-        chat = self._chat(chat_id)
-        users = list(chat["users"].values())
-        users.sort(key=lambda u: u.get(key, 0), reverse=True)
-        return users[:limit]
+        """Топ чата; имена подставляются только для попавших в топ."""
+        chat = self._find_chat(chat_id) or {}
+        users = sorted(chat.get("users", {}).items(), key=lambda kv: kv[1].get(key, 0), reverse=True)
+        return [dict(user, user_id=int(uid), name=self.name(uid)) for uid, user in users[:limit]]
+
+    def iter_users(self, chat_id: int | None = None):
+        """(chat_id, user_id, запись) по одному чату или по всем — без копии всего storage."""
+        if chat_id is not None:
+            chats = [(str(chat_id), self._find_chat(chat_id) or {})]
+        else:
+            chats = list(self.chats())
+        for cid, chat in chats:
+            # Копируем только список пользователей чата: между шагами loop может добавить новых
+            for uid, user in list(chat.get("users", {}).items()):
+                yield int(cid), int(uid), user
 
     def chat_stats(self, chat_id: int):
-        return self._chat(chat_id)
+        return self._find_chat(chat_id) or {"games_played": 0, "users": {}}
+
+    def global_top(self, key: str = "money", limit: int = 10):
+        """Топ по всем чатам (сумма по чатам) без пересчёта."""
+        return self.board.top(key, limit)
+
+    def global_rank(self, user_id: int, key: str = "money"):
+        return self.board.rank(user_id, key)
 
-# Singleton instance
-storage = Storage()
+# Singleton instance (в мультибот-режиме — storage текущего бота, см. tenant.py)
+storage = TenantLocal("storage", Storage)
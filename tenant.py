@@ -0,0 +1,154 @@
+# tenant.py
+"""Несколько ботов в одном процессе: контекст «текущего бота».
+
+Обработчики и задачи JobQueue выполняются с активным Tenant (ContextVar),
+поэтому storage, история, бэкапы, список админов и настройки у каждого
+бота свои, хотя код main.py про это ничего не знает. Без мультибота
+Tenant не активен и всё работает как раньше — через общие объекты.
+
+Настройки бота читаются через conf (conf.DAILY_BONUS), а не settings:
+settings — общие для процесса (метрики, логи, пути по умолчанию), их
+переопределить для одного бота нельзя (PROCESS_SETTINGS).
+"""
+
+import asyncio
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from telegram.ext import Application, JobQueue
+
+import settings
+
+_current: ContextVar["Tenant | None"] = ContextVar("tenant", default=None)
+
+# Общие для процесса настройки (точные имена и префиксы) — в bots.json их менять нельзя
+PROCESS_SETTINGS = (
+    "METRICS_", "LOG_", "STATS_API_", "MULTIBOT_", "BACKUP_DIR", "BACKUP_FULL_EVERY",
+    "BACKUP_KEEP_CHAINS", "STATS_FILE", "HISTORY_DIR", "ARCHIVE_DIR", "TABLE_CARD_ATLAS",
+    "TABLE_RENDER_WORKERS",
+)
+
+
+class Config:
+    """settings.py с переопределениями одного бота: снимок обычных атрибутов."""
+
+    def __init__(self, overrides: dict):
+        for name in dir(settings):
+            if name.isupper():
+                setattr(self, name, getattr(settings, name))
+        for name, value in overrides.items():
+            setattr(self, name, value)
+
+
+@dataclass
+class Tenant:
+    name: str
+    token: str
+    storage: object
+    history: object
+    backups: object
+    admin_ids: set | None = None                  # None — TELEGRAM_ADMIN_ID из окружения
+    settings: dict = field(default_factory=dict)  # переопределения settings.py для этого бота
+    stop_event: asyncio.Event | None = None       # /stop останавливает только этого бота
+    config: Config = field(init=False)            # settings + переопределения, см. conf
+    locals: dict = field(default_factory=dict)    # объекты TenantLocal, которых нет в полях
+
+    def __post_init__(self):
+        self.config = Config(self.settings)
+
+
+def current() -> Tenant | None:
+    return _current.get()
+
+
+def activate(tenant: Tenant | None):
+    """Сделать tenant текущим; вернуть токен для reset()."""
+    return _current.set(tenant)
+
+
+def reset(token):
+    _current.reset(token)
+
+
+class TenantLocal:
+    """Прокси к объекту текущего бота (Tenant.<attr>) или к общему по умолчанию.
+
+    Общий объект создаётся при первом обращении, поэтому в мультибот-режиме
+    лишний storage.json из рабочей папки не загружается. Если такого поля у
+    Tenant нет, объект бота создаётся factory() при первом обращении в его
+    контексте (лимиты, кэши main.py) — уже с его настройками из conf.
+    """
+
+    def __init__(self, attr: str, factory):
+        self._attr = attr
+        self._factory = factory
+        self._default = None
+
+    def _target(self):
+        t = _current.get()
+        if t is not None:
+            if self._attr in t.__dataclass_fields__:
+                return getattr(t, self._attr)
+            obj = t.locals.get(self._attr)
+            if obj is None:
+                obj = t.locals[self._attr] = self._factory()
+            return obj
+        if self._default is None:
+            self._default = self._factory()
+        return self._default
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+class TenantApplication(Application):
+    """Application, который обрабатывает каждый апдейт в контексте своего бота."""
+
+    def __init__(self, *, tenant: Tenant | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.tenant = tenant
+
+    async def process_update(self, update):
+        token = activate(self.tenant)
+        try:
+            return await super().process_update(update)
+        finally:
+            reset(token)
+
+
+class TenantJobQueue(JobQueue):
+    """JobQueue, которая может работать на общем планировщике нескольких ботов.
+
+    Видит и останавливает только свои задачи; сам планировщик выключает
+    тот, кто его создал (лаунчер мультибота).
+    """
+
+    def __init__(self, scheduler=None):
+        super().__init__()
+        self._shared = scheduler is not None
+        if self._shared:
+            self.scheduler = scheduler
+
+    @staticmethod
+    async def job_callback(job_queue, job):
+        token = activate(getattr(job_queue.application, "tenant", None))
+        try:
+            await JobQueue.job_callback(job_queue, job)
+        finally:
+            reset(token)
+
+    def jobs(self, pattern=None):
+        all_jobs = super().jobs(pattern)
+        if not self._shared:
+            return all_jobs
+        return tuple(j for j in all_jobs if j.job.args[0] is self)
+
+    async def stop(self, wait: bool = True):
+        if not self._shared:
+            return await super().stop(wait)
+        for job in self.jobs():
+            job.schedule_removal()
+
+
+# Настройки текущего бота; без мультибота — сам модуль settings
+conf = TenantLocal("config", lambda: settings)
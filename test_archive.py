@@ -0,0 +1,27 @@
+# test_archive.py
+"""Холодный архив: запись, чтение и удаление записей по чату."""
+
+from archive import ColdArchive
+
+
+def test_round_trip_and_drop(tmp_path):
+    archive = ColdArchive(str(tmp_path))
+    archive.put_users(-1, {"1": {"money": 10}})
+    archive.put_chat(-1, {"games_played": 3, "users": {"2": {"money": 20}}})
+    archive.put_users(-2, {"5": {"money": 1}})
+
+    # Новый процесс видит то же самое, индекс строится по файлам
+    archive = ColdArchive(str(tmp_path))
+    assert len(archive) == 2 and -1 in archive
+    assert archive.read(-1) == {"chat": {"games_played": 3}, "users": {"1": {"money": 10}, "2": {"money": 20}}}
+    assert archive.peek_user(-1, 2) == {"money": 20}
+    assert archive.peek_user(-1, 5) is None
+    assert archive.user_ids(-1) == {"1", "2"}
+
+    archive.drop(-1, ["2"], chat=True)
+    assert archive.read(-1) == {"chat": None, "users": {"1": {"money": 10}}}
+    assert not archive.has_user(-1, 2)
+    # Пустой архив чата удаляется вместе с файлом
+    archive.drop(-1, ["1"])
+    assert -1 not in archive
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["-2.json.gz"]
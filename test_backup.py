@@ -0,0 +1,40 @@
+# test_backup.py
+"""Цепочка бэкапов: полный + инкременты, восстановление и снимок из консоли."""
+
+import json
+
+import pytest
+
+from backup import BackupStore, snapshot_file
+
+
+def _raw(chat):
+    return json.dumps(chat, ensure_ascii=False)
+
+
+def test_restore_replays_chain_from_last_full(tmp_path):
+    store = BackupStore(str(tmp_path))
+    store.write({"-1": _raw({"games_played": 1}), "-2": _raw({"games_played": 5})}, full=True)
+    # Неизменённый чат в инкремент не попадает
+    assert store.write({"-2": _raw({"games_played": 5})}) is None
+    first = store.write({"-1": _raw({"games_played": 2})})
+    store.write({"-3": _raw({"games_played": 1})}, removed=["-2"])
+
+    assert first["chats"] == 1
+    assert store.restore() == {"-1": {"games_played": 2}, "-3": {"games_played": 1}}
+    assert store.restore(upto=first["file"]) == {"-1": {"games_played": 2}, "-2": {"games_played": 5}}
+
+
+def test_snapshot_refused_while_bot_holds_directory(tmp_path):
+    path = tmp_path / "storage.json"
+    path.write_text(json.dumps({"-1": {"games_played": 1}}), encoding="utf-8")
+    bot = BackupStore(str(tmp_path / "backups"))
+    assert bot.hold()
+
+    cli = BackupStore(str(tmp_path / "backups"))
+    with pytest.raises(RuntimeError):
+        snapshot_file(cli, str(path))
+    assert cli.load_manifest()["chain"] == []
+
+    bot._hold.close()
+    assert snapshot_file(cli, str(path))["kind"] == "full"
@@ -0,0 +1,61 @@
+# test_dedup.py
+"""Отсев дублей callback-запросов: TTL-кэш и двойные нажатия."""
+
+import asyncio
+from types import SimpleNamespace
+
+import dedup
+from dedup import CallbackDeduper, TTLCache, dedup_callback
+
+
+def _query(qid, data="hit:1", text="Ваш ход"):
+    async def answer(*args, **kwargs):
+        pass
+
+    message = SimpleNamespace(chat=SimpleNamespace(id=-100), message_id=7, text=text)
+    return SimpleNamespace(id=qid, data=data, message=message, inline_message_id=None,
+                           from_user=SimpleNamespace(id=1), answer=answer)
+
+
+def test_ttl_cache_expires_and_caps_size(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(dedup.time, "monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10, maxsize=2)
+    cache.add("a")
+    now[0] += 5
+    cache.add("b")
+    assert "a" in cache and "b" in cache
+    now[0] += 6
+    assert "a" not in cache and "b" in cache
+    cache.add("c")
+    cache.add("d")
+    assert len(cache) == 2 and "b" not in cache
+
+
+def test_double_press_is_dropped_until_message_changes():
+    deduper = CallbackDeduper(query_ttl=60, action_ttl=60)
+    assert deduper.claim(_query("1"))
+    # Повтор того же id и второе нажатие во время обработки
+    assert not deduper.claim(_query("1"))
+    assert not deduper.claim(_query("2"))
+    deduper.release(_query("1"))
+    assert not deduper.claim(_query("3"))
+    # После хода текст сообщения другой — новое нажатие честное
+    assert deduper.claim(_query("4", text="Ваш ход, карт: 3"))
+
+
+def test_decorator_without_remember_allows_repeat_after_finish():
+    deduper = CallbackDeduper(query_ttl=60, action_ttl=60)
+    calls = []
+
+    @dedup_callback(deduper, remember=False)
+    async def cb_join(update, context):
+        calls.append(update.callback_query.id)
+
+    async def run():
+        await cb_join(SimpleNamespace(callback_query=_query("1", data="join")), None)
+        await cb_join(SimpleNamespace(callback_query=_query("1", data="join")), None)
+        await cb_join(SimpleNamespace(callback_query=_query("2", data="join")), None)
+
+    asyncio.run(run())
+    assert calls == ["1", "2"]
@@ -0,0 +1,46 @@
+# test_history.py
+"""Сводки истории: запись раз в flush и догон по сегментам при запуске."""
+
+import json
+import os
+import time
+from types import SimpleNamespace
+
+from game import Card
+from history import GameHistory
+
+TS = int(time.time())
+
+
+def _game(gid, outcomes):
+    return SimpleNamespace(id=gid, bank=0, dealer=[Card("10", "♠️"), Card("7", "♥️")], outcomes=outcomes)
+
+
+def test_rollups_catch_up_after_unflushed_games(tmp_path):
+    h = GameHistory(str(tmp_path))
+    h.record(-1, _game("a", {1: (20, "win", 20)}), price=10, ts=TS)
+    h.flush()
+    h.record(-1, _game("b", {1: (15, "lose", 0)}), price=10, ts=TS + 60)
+    # Вторая игра не сброшена: новый процесс догоняет её по сегменту
+    stats = GameHistory(str(tmp_path)).period_stats(-1, "day", ts=TS)
+    assert stats["games"] == 2
+    assert stats["users"]["1"] == {"games": 2, "wins": 1, "net": 0}
+
+
+def test_rollups_rebuilt_when_missing(tmp_path):
+    h = GameHistory(str(tmp_path))
+    h.record(-1, _game("a", {1: (20, "win", 20), 2: (25, "lose", 0)}), price=10, ts=TS)
+    os.remove(h.rollups_path)
+
+    h = GameHistory(str(tmp_path))
+    assert h.period_stats(-1, "week", ts=TS)["games"] == 1
+    with open(h.rollups_path, encoding="utf-8") as f:
+        assert json.load(f)["upto"][1] > 0
+
+
+def test_old_rollups_without_position_are_not_replayed(tmp_path):
+    h = GameHistory(str(tmp_path))
+    h.record(-1, _game("a", {1: (20, "win", 20)}), price=10, ts=TS)
+    del h._rollups["upto"]
+    h.save_rollups()
+    assert GameHistory(str(tmp_path)).period_stats(-1, "day", ts=TS)["games"] == 1
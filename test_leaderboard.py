@@ -0,0 +1,38 @@
+# test_leaderboard.py
+"""Глобальный рейтинг: индекс мест и обновление по дельтам."""
+
+from leaderboard import GlobalLeaderboard, RankIndex
+
+
+def test_rank_index_orders_and_updates():
+    index = RankIndex()
+    index.set(1, 50)
+    index.set(2, 80)
+    index.set(3, 50)
+    assert index.top(2) == [(2, 80), (1, 50)]
+    assert index.rank(3) == 3
+    index.set(3, 100)
+    assert index.rank(3) == 1 and index.rank(2) == 2
+    index.remove(2)
+    assert len(index) == 2 and index.rank(2) is None
+    assert index.top(10) == [(3, 100), (1, 50)]
+
+
+def test_board_sums_chats_and_follows_archive():
+    chats = {
+        "-1": {"users": {"1": {"money": 100, "wins": 2, "games": 5}, "2": {"money": 300}}},
+        "-2": {"users": {"1": {"money": 250, "wins": 1, "games": 1}}},
+    }
+    board = GlobalLeaderboard.from_chats(chats, {"1": {"name": "Alice"}})
+    assert board.top("money", 1) == [{"user_id": 1, "name": "Alice", "money": 350}]
+    assert board.rank(2) == (2, 300, 2)
+
+    board.add(2, "money", 100)
+    assert board.rank(2) == (1, 400, 2)
+    # Одна из двух записей ушла в архив — остаётся сумма по оставшейся
+    board.leave(1, chats["-2"]["users"]["1"])
+    assert board.rank(1, "wins") == (1, 2, 2)
+    board.leave(1, chats["-1"]["users"]["1"])
+    assert board.rank(1) is None
+    board.join(1, chats["-1"]["users"]["1"])
+    assert board.rank(1, "games") == (1, 5, 2)
@@ -0,0 +1,41 @@
+# test_livetable.py
+"""Живой стол: текст влезает в лимит сообщения, неудачный open не оставляет стола."""
+
+import asyncio
+from types import SimpleNamespace
+
+from game import Card, Game
+from livetable import MESSAGE_LIMIT, LiveTables, _units, table_text
+
+
+def _game(players: int, name: str) -> Game:
+    game = Game()
+    for uid in range(players):
+        game.add_player(uid, name)
+        game.players[uid]["hand"] = [Card("A", "♠️"), Card("K", "♥️")]
+    game.dealer = [Card("10", "♦️"), Card("5", "♣️")]
+    game.started = True
+    return game
+
+
+def test_table_text_fits_message_limit():
+    # Длинные имена с эмодзи: в UTF-16 каждый занимает две единицы
+    text = table_text(_game(500, "😀" * 128), max_players=500)
+    assert _units(text) <= MESSAGE_LIMIT
+    assert text.splitlines()[-1].startswith("… и ещё ")
+
+
+def test_table_text_shows_everyone_when_it_fits():
+    text = table_text(_game(3, "Alice"), max_players=10)
+    assert "и ещё" not in text
+    assert text.count("Alice") == 3
+
+
+def test_failed_open_leaves_no_table():
+    async def send_message(chat_id, text):
+        raise RuntimeError("chat not found")
+
+    context = SimpleNamespace(bot=SimpleNamespace(id=1, send_message=send_message))
+    tables = LiveTables(interval=1.0, max_players=10)
+    asyncio.run(tables.open(context, -100, _game(2, "Bob")))
+    assert not tables.has(context, -100)
@@ -0,0 +1,30 @@
+# test_ratelimit.py
+"""Лимит частоты команд: token bucket и уборка полных корзин."""
+
+import ratelimit
+from ratelimit import RateLimiter, TokenBucket
+
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(burst=2, now=0.0)
+    assert bucket.take(rate=1.0, burst=2, now=0.0)
+    assert bucket.take(rate=1.0, burst=2, now=0.0)
+    assert not bucket.take(rate=1.0, burst=2, now=0.5)
+    assert bucket.take(rate=1.0, burst=2, now=1.0)
+    # Долгий простой не копит больше burst
+    for _ in range(2):
+        assert bucket.take(rate=1.0, burst=2, now=100.0)
+    assert not bucket.take(rate=1.0, burst=2, now=100.0)
+
+
+def test_limiter_separates_keys_and_sweeps_idle(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    limiter = RateLimiter(per_minute=60, burst=1)
+    assert limiter.allow("a")
+    assert not limiter.allow("a")
+    assert limiter.allow("b")
+    now[0] += 5
+    limiter.allow("c")
+    # Корзины a и b давно полны — их больше не держим
+    assert len(limiter) == 1
@@ -0,0 +1,65 @@
+# test_storage.py
+"""Архив storage: поднятие чата из архива и повторная архивация до save()."""
+
+import time
+
+from storage import Storage
+
+
+def test_restore_then_archive_users_keeps_archived_before_save(tmp_path):
+    st = Storage(str(tmp_path / "storage.json"))
+    st.get_user(-100, 1, "Alice")
+    st.get_user(-100, 2, "Bob")
+    st.save()
+    assert st.archive_chat(-100)
+    st.save()
+
+    # Чистое чтение поднимает чат из архива; save() ещё не было
+    assert st.get_setting(-100, "auto_game_enabled") is None
+    st.chat_stats(-100)["users"]["2"]["last_seen"] = 0
+    assert st.archive_users(-100, st.idle_users(time.time() - 60)["-100"]) == 1
+    st.save()
+
+    assert st.archive.peek_user(-100, 2) is not None
+    assert st.archive.read(-100)["chat"] is None
+    assert st.find_user(-100, 1) is not None
+
+    # Новый процесс: Bob по-прежнему поднимается из архива
+    st = Storage(str(tmp_path / "storage.json"))
+    assert st.find_user(-100, 2) is not None
+
+
+def test_archive_index_skips_gzip_for_unknown_users(tmp_path, monkeypatch):
+    st = Storage(str(tmp_path / "storage.json"))
+    st.get_user(-100, 1, "Alice")
+    st.chat_stats(-100)["users"]["1"]["last_seen"] = 0
+    assert st.archive_users(-100, ["1"]) == 1
+    st.save()
+
+    # Индекс восстанавливается при открытии архива
+    st = Storage(str(tmp_path / "storage.json"))
+    assert st.archive.has_user(-100, 1) and not st.archive.has_user(-100, 2)
+    reads = []
+    monkeypatch.setattr(st.archive, "read", lambda cid: reads.append(cid))
+    assert st.find_user(-100, 2) is None
+    assert reads == []
+
+
+def test_import_validation_restores_only_applied_users(tmp_path, monkeypatch):
+    import bulk
+
+    st = Storage(str(tmp_path / "storage.json"))
+    for uid in (1, 2, 3):
+        st.get_user(-100, uid, f"P{uid}")
+    st.chat_stats(-100)["users"]["1"]["money"] = 10
+    assert st.archive_users(-100, ["1", "2"]) == 2
+    st.save()
+    monkeypatch.setattr(bulk, "storage", st)
+
+    applied, skipped = bulk.apply_deltas({(-100, 1): [5, 1], (-100, 4): [7, 2], (-200, 1): [1, 1]})
+    assert (applied, skipped) == (1, 3)
+    assert st.find_user(-100, 1)["money"] == 15
+    # Bob проверкой не задет: остаётся в архиве, а не в storage
+    assert "2" not in st.chat_stats(-100)["users"]
+    assert st.archived_count(-100) == 1
+    assert st.find_user(-100, 4) is None and st.find_user(-200, 1) is None